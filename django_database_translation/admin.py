@@ -11,10 +11,12 @@ Inlines:
 Abstract Admins:
     TranslatedAdmin: ModelAdmin to use as parent for any model that has fields to translate
 Admins:
-    FieldAdmin: Customizes the Field model in the administration interface
+    FieldAdmin: Customizes the Field model in the administration interface, with set-based deletions
     ItemAdmin: Customizes the Item model in the administration interface
-    LanguageAdmin: Customizes the Language model in the administration interface
+    LanguageAdmin: Customizes the Language model in the administration interface, with a translation grid editor
+                   and an action that copies the missing texts of cloned languages
     TranslationAdmin: Customizes the Translation model in the administration interface
+    TranslationJobAdmin: Displays the progress of the TranslationJob queue in the administration interface
 """
 
 
@@ -25,16 +27,28 @@ Admins:
 
 # Django
 from django.contrib.admin.utils import flatten_fieldsets
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.forms import ModelChoiceField
+from django.http import HttpResponseBadRequest, HttpResponseRedirect
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
 
 # Third-party
 
 # Local
+from .bulk import clone_language, delete_field
+from .conf import get_setting
 from .forms import DynamicTranslationForm, create_translation_fieldname
-from .models import Field, Item, Language, Translation
-from .signals import translated_models
+from .jobs import enqueue_job
+from .models import Field, Item, Language, Translation, TranslationJob
+from .signals import translated_models, translations_bulk_saved
 
 
 # --------------------------------------------------------------------------------
@@ -110,6 +124,13 @@ class TranslationInline(admin.TabularInline):
         ],
     )
 
+    # ----------------------------------------
+    # Custom Methods
+    # ----------------------------------------
+    def get_queryset(self, request):
+        """Fetches the deduplicated texts within the same query (see DDT_DEDUPLICATE_TEXTS)"""
+        return super().get_queryset(request).select_texts()
+
 
 # --------------------------------------------------------------------------------
 # > Abstract Admins
@@ -156,7 +177,7 @@ class TranslatedAdmin(admin.ModelAdmin):
             obj = self.model.objects.get(pk=object_id)
             # Create a field for each translation associated with our object
             fields = []
-            translations = obj.get_translations()
+            translations = obj.get_or_build_translations()
             for translation in translations:
                 fieldname = create_translation_fieldname(translation)
                 fields.append(fieldname)
@@ -238,6 +259,15 @@ class FieldAdmin(admin.ModelAdmin):
     # ----------------------------------------
     # Custom Methods
     # ----------------------------------------
+    def delete_model(self, request, obj):
+        """Deletes the Field with set-based queries (see 'delete_field')"""
+        delete_field(obj)
+
+    def delete_queryset(self, request, queryset):
+        """Deletes each Field with set-based queries (see 'delete_field')"""
+        for field in queryset:
+            delete_field(field)
+
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         """Allows us to override how Content Type are displayed in a dropdown"""
         if db_field.name == "content_type":
@@ -246,6 +276,16 @@ class FieldAdmin(admin.ModelAdmin):
             return ContentTypeDropdown(**kwargs)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
+    def get_deleted_objects(self, objs, request):
+        """Only counts the Items and Translations on the confirmation page, instead of listing them all"""
+        fields = list(objs)
+        model_count = {
+            Field._meta.verbose_name_plural: len(fields),
+            Item._meta.verbose_name_plural: Item.objects.filter(field__in=fields).count(),
+            Translation._meta.verbose_name_plural: Translation.objects.filter(item__field__in=fields).count(),
+        }
+        return [str(field) for field in fields], model_count, set(), []
+
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
@@ -317,13 +357,16 @@ class LanguageAdmin(admin.ModelAdmin):
     # ----------------------------------------
     # List view
     # ----------------------------------------
+    actions = ["copy_cloned_translations"]
     list_display = [
         "id",
         "name",
         "iso2",
         "iso3",
         "django_language_name",
-        "count_missing_translations"
+        "fallback",
+        "count_missing_translations",
+        "translation_grid_link",
     ]
     list_display_links = [
         "id",
@@ -374,11 +417,163 @@ class LanguageAdmin(admin.ModelAdmin):
                     "iso2",
                     "iso3",
                     "django_language_name",
+                    "fallback",
+                    "cloned_from",
                 ],
             }
         ],
     ]
 
+    # ----------------------------------------
+    # Custom Methods
+    # ----------------------------------------
+    def copy_cloned_translations(self, request, queryset):
+        """Copies the missing texts of the selected languages from the ones they are cloned from"""
+        for language in queryset.exclude(cloned_from=None).select_related("cloned_from"):
+            self.copy_language_texts(request, language)
+    copy_cloned_translations.allowed_permissions = ("change",)
+    copy_cloned_translations.short_description = "Copy the missing texts from the cloned language"
+
+    def save_model(self, request, obj, form, change):
+        """Also copies the texts of the "cloned_from" language when it is set on an existing Language"""
+        super().save_model(request, obj, form, change)
+        if change and "cloned_from" in form.changed_data and obj.cloned_from_id is not None:
+            self.copy_language_texts(request, obj)
+
+    @staticmethod
+    def copy_language_texts(request, language):
+        """Copies the missing texts of a Language (or creates the job that does it), and tells the user"""
+        if get_setting("ASYNC_FANOUT"):
+            enqueue_job(TranslationJob.KIND_LANGUAGE, language=language)
+            messages.info(request, "The texts of {} will be copied by 'process_translation_jobs'".format(language))
+        else:
+            count = clone_language(language)
+            messages.success(request, "{} texts copied from {} to {}".format(count, language.cloned_from, language))
+
+    # ----------------------------------------
+    # Translation Grid
+    # ----------------------------------------
+    grid_per_page = 50
+    grid_template = "admin/django_database_translation/language/translation_grid.html"
+
+    def get_urls(self):
+        """Adds the URL of the translation grid"""
+        urls = [
+            path(
+                "<path:object_id>/grid/",
+                self.admin_site.admin_view(self.translation_grid_view),
+                name="django_database_translation_language_grid",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def translation_grid_link(self, obj):
+        """Returns a link towards the translation grid of the language"""
+        url = reverse("admin:django_database_translation_language_grid", args=[obj.pk])
+        return format_html('<a href="{}">Translate</a>', url)
+    translation_grid_link.short_description = "Grid"
+
+    def translation_grid_view(self, request, object_id):
+        """
+        Displays a paginated grid of Items, with their source and target texts side by side
+        The grid can be filtered by application, field, and "missing only"
+        Saving a page updates all the modified texts with a single "bulk_update" (and one "bulk_create")
+        """
+        if not request.user.has_perm("django_database_translation.change_translation"):
+            raise PermissionDenied
+        target = get_object_or_404(Language, pk=object_id)
+        for name in ["source", "field"]:
+            if request.GET.get(name) and not request.GET[name].isdigit():
+                return HttpResponseBadRequest("The '{}' parameter must be an id".format(name))
+        languages = Language.objects.exclude(pk=target.pk)
+        source = languages.filter(pk=request.GET.get("source") or target.fallback_id).first() or languages.first()
+        # Filter the items
+        items = Item.objects.select_related("field__content_type").order_by("pk")
+        if request.GET.get("app"):
+            items = items.filter(content_type__app_label=request.GET["app"])
+        if request.GET.get("field"):
+            items = items.filter(field_id=request.GET["field"])
+        if request.method == "POST":
+            # The posted items are saved even if they left the page (ie filled by someone else in "missing only")
+            posted_ids = [
+                int(key[len("text_"):]) for key in request.POST
+                if key.startswith("text_") and key[len("text_"):].isdigit()
+            ]
+            items = list(items.filter(pk__in=posted_ids))
+            translations = {
+                translation.item_id: translation
+                for translation in Translation.objects.filter(item__in=items, language=target).select_texts()
+            }
+            self.save_translation_grid(request, target, items, translations)
+            return HttpResponseRedirect(request.get_full_path())
+        if request.GET.get("missing"):
+            filled = Translation.objects.filter(item=OuterRef("pk"), language=target).non_empty()
+            items = items.filter(~Exists(filled))
+        page = Paginator(items, self.grid_per_page).get_page(request.GET.get("page"))
+        # Get the source and target texts of the whole page with a single query
+        languages_ids = [target.pk] if source is None else [target.pk, source.pk]
+        translations = {
+            (translation.item_id, translation.language_id): translation
+            for translation in Translation.objects.filter(
+                item__in=page.object_list, language__in=languages_ids
+            ).select_texts()
+        }
+        rows = []
+        for item in page.object_list:
+            source_translation = translations.get((item.pk, source.pk)) if source is not None else None
+            target_translation = translations.get((item.pk, target.pk))
+            rows.append({
+                "item": item,
+                "source": source_translation.text if source_translation is not None else "",
+                "target": target_translation.text if target_translation is not None else "",
+            })
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Translate into {}".format(target),
+            "target": target,
+            "source": source,
+            "languages": languages,
+            "applications": sorted({field.get_app_name() for field in Field.objects.select_related("content_type")}),
+            "fields": Field.objects.select_related("content_type"),
+            "page": page,
+            "rows": rows,
+            "filters": request.GET,
+        }
+        return TemplateResponse(request, self.grid_template, context)
+
+    @staticmethod
+    def save_translation_grid(request, target, items, translations):
+        """
+        Saves the texts posted from the translation grid, using bulk queries
+        The translations of the target language must be indexed by item id
+        In sparse mode, emptied translations are deleted and empty ones are not created
+        """
+        sparse = get_setting("SPARSE_TRANSLATIONS")
+        to_update, to_create, to_delete = [], [], []
+        for item in items:
+            text = request.POST.get("text_{}".format(item.pk))
+            if text is None:
+                continue
+            translation = translations.get(item.pk)
+            if translation is None:
+                if text or not sparse:
+                    to_create.append(Translation(item=item, language=target, text=text))
+            elif sparse and not text and translation.text:
+                translation.text = ""
+                to_delete.append(translation)
+            elif translation.text != text:
+                translation.text = text
+                to_update.append(translation)
+        with transaction.atomic():
+            Translation.objects.bulk_update(to_update, ["text"])
+            Translation.objects.bulk_create(to_create, ignore_conflicts=True)
+            Translation.objects.filter(pk__in=[translation.pk for translation in to_delete]).delete()
+        # The deleted translations are sent with an empty text, for receivers like the snapshot
+        translations_bulk_saved.send(sender=Translation, translations=to_update + to_create + to_delete)
+        count = len(to_update) + len(to_create) + len(to_delete)
+        messages.success(request, "{} translations saved".format(count))
+
 
 # Remove the comment below to access Item within the admin
 # Only for debugging purposes
@@ -445,3 +640,110 @@ class TranslationAdmin(admin.ModelAdmin):
             }
         ],
     ]
+
+    # ----------------------------------------
+    # Custom Methods
+    # ----------------------------------------
+    def get_queryset(self, request):
+        """Fetches the deduplicated texts within the same query (see DDT_DEDUPLICATE_TEXTS)"""
+        return super().get_queryset(request).select_texts()
+
+
+@admin.register(TranslationJob)
+class TranslationJobAdmin(admin.ModelAdmin):
+    """
+    Displays the progress of the TranslationJob queue in the administration interface
+    Jobs are created by 'signals.py' and processed by the 'process_translation_jobs' command
+    They can only be viewed (and deleted), not created nor edited
+    """
+
+    # ----------------------------------------
+    # List view
+    # ----------------------------------------
+    list_display = [
+        "id",
+        "kind",
+        "field",
+        "language",
+        "status",
+        "progress",
+        "updated_at",
+    ]
+    list_display_links = ["id"]
+    list_editable = []
+    list_filter = [
+        "kind",
+        "status",
+    ]
+    ordering = ["-id"]
+    search_fields = []
+    sortable_by = [
+        "id",
+        "kind",
+        "status",
+        "updated_at",
+    ]
+
+    # ----------------------------------------
+    # Detail view
+    # ----------------------------------------
+    autocomplete_fields = []
+    readonly_fields = [
+        "id",
+        "kind",
+        "field",
+        "language",
+        "app_label",
+        "status",
+        "progress",
+        "start_pk",
+        "end_pk",
+        "cursor",
+        "processed",
+        "total",
+        "error",
+        "created_at",
+        "updated_at",
+    ]
+    radio_fields = {}
+    raw_id_fields = []
+    fieldsets = [
+        [
+            "CORE INFORMATION", {
+                "fields": [
+                    "id",
+                    "kind",
+                    "field",
+                    "language",
+                    "app_label",
+                    "start_pk",
+                    "end_pk",
+                ],
+            }
+        ],
+        [
+            "PROGRESS", {
+                "fields": [
+                    "status",
+                    "progress",
+                    "cursor",
+                    "processed",
+                    "total",
+                    "created_at",
+                    "updated_at",
+                ],
+            }
+        ],
+        [
+            "ERROR", {
+                "fields": ["error"],
+            }
+        ],
+    ]
+
+    # ----------------------------------------
+    # Custom Methods
+    # ----------------------------------------
+    def has_add_permission(self, request):
+        """Jobs are only created by our signals"""
+        return False
@@ -0,0 +1,333 @@
+# coding: utf-8
+"""
+Description:
+    Contains set-based helpers to create Item and Translation instances for many rows at once
+    They do the same work as our signals, but with a few queries per chunk instead of several queries per row:
+        - Items are inserted with "bulk_create", ignoring the ones that already exist
+        - Their keys are written back into the objects with a single UPDATE
+        - Their translations are inserted with "bulk_create", ignoring the ones that already exist
+    Since they are idempotent, they can be called again on a chunk that was partially processed
+    Since they do not send signals, they increment the TranslationVersion rows themselves (see "versions.py")
+    Note that the objects are updated through the database: their own "save" method and signals are not called
+    The same goes for "delete_field", which removes a Field without loading its Items and Translations in memory,
+    for "delete_empty_translations", which removes the empty rows without sending one "post_delete" per row,
+    and for "clone_translations", which copies the translations of a Language with a single INSERT ... SELECT
+    (the lookups, snapshots and bundles of the copied texts are then refreshed by "refresh_cloned_translations")
+Functions:
+    clone_language: Copies the missing translations of a Language from the one it is cloned from, and refreshes them
+    clone_translations: Copies the missing translations of a Language from another one, with a single query
+    create_items: Creates the missing Items of a Field for the given objects, and writes their keys back
+    create_translations_for_items: Creates the missing Translation instances of the given Items, in every Language
+    create_translations_for_language: Creates the missing Translation instances of a Language, for the given Items
+    delete_empty_translations: Deletes the empty Translation rows with set-based queries, for the sparse mode
+    delete_field: Deletes a Field, its Items and their Translations with set-based queries
+    refresh_cloned_translations: Refreshes the lookups, snapshots and bundles of the translations copied by a clone
+    set_translation_texts: Writes the texts of many Items in a Language, updating or inserting their Translations
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.core.exceptions import FieldDoesNotExist
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, models, router
+from django.db.models import Exists, OuterRef, Subquery
+
+# Third-party
+
+# Local
+from .bundles import schedule_bundles
+from .conf import get_setting
+from .lookups import refresh_translation_lookups
+from .lazy import invalidate_loaders
+from .models import Field, Item, Language, SnapshotTranslatedModel, Translation, TranslationLookup
+from .versions import bump_versions_on_commit
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+def create_items(field, object_ids):
+    """
+    Description:
+        Creates the missing Items of a Field for the given objects, and writes their keys back into the objects
+        Then creates the Translation instances of those items (unless we are in sparse mode)
+    Args:
+        field (Field): Field instance from this app
+        object_ids (list): Primary keys of objects from the Field's model
+    Returns:
+        list: The ids of the Items linked to the given objects
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return []
+    model = field.content_type.model_class()
+    attname = model._meta.get_field(field.name).attname
+    # Our manager blocks "bulk_create" to protect the signals, which we replace here
+    items = [Item(field=field, object_id=pk, content_type_id=field.content_type_id) for pk in object_ids]
+    Item._base_manager.bulk_create(items, ignore_conflicts=True)
+    # Write the keys back into the objects that do not have one yet
+    item_id = Item.objects.filter(field=field, object_id=OuterRef("pk")).values("pk")[:1]
+    model._base_manager.filter(pk__in=object_ids, **{attname: None}).update(**{attname: Subquery(item_id)})
+    item_ids = list(Item.objects.filter(field=field, object_id__in=object_ids).values_list("pk", flat=True))
+    create_translations_for_items(item_ids)
+    bump_versions_on_commit(content_type_ids=[field.content_type_id])
+    return item_ids
+
+
+def clone_language(language, chunk_size=5000):
+    """
+    Description:
+        Copies the missing translations of a Language from the one it is cloned from (see "clone_translations")
+        Then refreshes their lookups, snapshots and bundles, chunk by chunk of Items
+    Args:
+        language (Language): Language instance whose "cloned_from" is set
+        chunk_size (int, optional): Amount of Items refreshed at once. Defaults to 5000.
+    Returns:
+        int: The amount of inserted or filled translations
+    """
+    count = clone_translations(language.cloned_from, language)
+    last_pk = 0
+    while True:
+        ids = list(Item.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        refresh_cloned_translations(language, ids)
+        last_pk = ids[-1]
+    return count
+
+
+def clone_translations(source, language, item_ids=None):
+    """
+    Description:
+        Copies the missing translations of a Language from another one, with a single INSERT ... SELECT
+        Its empty translations are filled with a single UPDATE, and the ones with a text are left untouched
+        The texts never go through Python, and deduplicated texts keep sharing the same TranslationText row
+        Empty source texts are not copied in sparse mode
+        Since "post_save" is not sent, call "refresh_cloned_translations" afterwards (or use "clone_language")
+        The query runs on the write database, since it inserts rows
+    Args:
+        source (Language): Language instance whose texts are copied
+        language (Language): Language instance that receives the texts
+        item_ids (list, optional): Only copy the translations of those Items. Defaults to None (all of them).
+    Returns:
+        int: The amount of inserted or filled translations
+    """
+    using = router.db_for_write(Translation)
+    translations = Translation.objects.using(using)
+    existing = translations.filter(language=language).values("item_id")
+    rows = translations.filter(language=source).exclude(item_id__in=existing)
+    if item_ids is not None:
+        rows = rows.filter(item_id__in=list(item_ids))
+    if get_setting("SPARSE_TRANSLATIONS"):
+        rows = rows.non_empty()
+    # Every column is copied as is, except the language
+    fields = [
+        field for field in Translation._meta.concrete_fields
+        if not field.primary_key and field.name != "language"
+    ]
+    rows = rows.annotate(new_language_id=models.Value(language.pk, output_field=models.IntegerField()))
+    rows = rows.order_by().values_list(*[field.attname for field in fields], "new_language_id")
+    connection = connections[using]
+    select, params = rows.query.get_compiler(using).as_sql()
+    columns = [field.column for field in fields] + [Translation._meta.get_field("language").column]
+    query = "INSERT INTO {} ({}) {}".format(
+        connection.ops.quote_name(Translation._meta.db_table),
+        ", ".join(connection.ops.quote_name(column) for column in columns),
+        select,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        count = cursor.rowcount
+    # The empty translations that already exist (ie when "cloned_from" is set later) get the source text
+    texts = translations.filter(language=source, item_id=OuterRef("item_id")).non_empty()
+    empty = translations.filter(language=language).empty().filter(Exists(texts))
+    if item_ids is not None:
+        empty = empty.filter(item_id__in=list(item_ids))
+    count += empty.update(text=Subquery(texts.values("text")[:1]), text_ref=Subquery(texts.values("text_ref")[:1]))
+    if count:
+        content_type_ids = Field.objects.values_list("content_type_id", flat=True).distinct()
+        bump_versions_on_commit(content_type_ids=content_type_ids, language_ids=[language.pk])
+    return count
+
+
+def create_translations_for_items(item_ids, languages=None):
+    """
+    Description:
+        Creates the missing Translation instances of the given Items, in every Language
+        Does nothing in sparse mode, since empty translations are not stored
+    Args:
+        item_ids (list): Ids of Item instances from this app
+        languages (iterable, optional): Language instances to use. Defaults to all of them.
+    """
+    if get_setting("SPARSE_TRANSLATIONS") or not item_ids:
+        return
+    if languages is None:
+        languages = Language.objects.all()
+    translations = [
+        Translation(item_id=item_id, language=language)
+        for language in languages
+        for item_id in item_ids
+    ]
+    Translation.objects.bulk_create(translations, ignore_conflicts=True)
+
+
+def create_translations_for_language(language, item_ids):
+    """
+    Description:
+        Creates the missing Translation instances of a Language, for the given Items
+        If the Language is cloned from another one, their texts are copied first (see "clone_translations")
+        Empty translations are not created in sparse mode, since they are not stored
+    Args:
+        language (Language): Language instance from this app
+        item_ids (list): Ids of Item instances from this app
+    """
+    if language.cloned_from_id is not None:
+        clone_translations(language.cloned_from, language, item_ids)
+        refresh_cloned_translations(language, item_ids)
+    create_translations_for_items(item_ids, languages=[language])
+
+
+def delete_empty_translations(chunk_size=10000):
+    """
+    Description:
+        Deletes the empty Translation rows by chunks of ids, without Django's collector and its signals
+        Our "post_delete" receivers have nothing to do for them: an empty text has no lookup row,
+        is already empty in the snapshots and bundles, and reads the same as a missing row
+    Args:
+        chunk_size (int, optional): Amount of rows deleted per query. Defaults to 10000.
+    Returns:
+        int: The amount of deleted translations
+    """
+    count = _delete_by_chunks(Translation.objects.empty(), chunk_size)
+    invalidate_loaders()
+    return count
+
+
+def delete_field(field, chunk_size=5000):
+    """
+    Description:
+        Deletes a Field, its Items and their Translations with set-based queries, instead of Django's collector:
+            - the column of the Field's model is set to NULL with a single UPDATE
+              (skipped if the field was already removed from the model)
+            - the field is removed from the snapshots of the objects, if the model is a SnapshotTranslatedModel
+            - the Translations (and their lookup rows), then the Items, are deleted by chunks of ids
+            - the Field itself is deleted
+            - the JSON bundles of its application are scheduled (with settings.DDT_BUNDLE_ON_WRITE)
+        If it is interrupted, it can be called again to finish the work
+    Args:
+        field (Field): Field instance from this app
+        chunk_size (int, optional): Amount of rows deleted per query. Defaults to 5000.
+    Returns:
+        dict: The amount of "objects" updated, and of "translations" and "items" deleted
+    """
+    counts = {"objects": 0, "translations": 0, "items": 0}
+    model = field.content_type.model_class()
+    if model is not None:
+        try:
+            attname = model._meta.get_field(field.name).attname
+        except FieldDoesNotExist:
+            # The field was already removed from the model, along with its column
+            pass
+        else:
+            counts["objects"] = model._base_manager.exclude(**{attname: None}).update(**{attname: None})
+        if issubclass(model, SnapshotTranslatedModel):
+            _remove_from_snapshots(model, field.name, chunk_size)
+    _delete_by_chunks(TranslationLookup.objects.filter(item__field=field), chunk_size)
+    counts["translations"] = _delete_by_chunks(Translation.objects.filter(item__field=field), chunk_size)
+    counts["items"] = _delete_by_chunks(Item.objects.filter(field=field), chunk_size)
+    field.delete()
+    # Our raw deletes send no signal, so the caches maintained by our receivers are refreshed here
+    invalidate_loaders()
+    bump_versions_on_commit(content_type_ids=[field.content_type_id])
+    if get_setting("BUNDLE_ON_WRITE"):
+        schedule_bundles([field.content_type.app_label], Language.objects.values_list("pk", flat=True))
+    return counts
+
+
+def refresh_cloned_translations(language, item_ids):
+    """
+    Description:
+        Does the work of our "post_save" callbacks for the translations copied by "clone_translations":
+            - their lookup rows are refreshed (with settings.DDT_LOOKUP_TABLE)
+            - the snapshots of their objects are rebuilt, if their models use one
+            - the JSON bundles of their applications are scheduled (with settings.DDT_BUNDLE_ON_WRITE)
+    Args:
+        language (Language): Language instance that received the texts
+        item_ids (list): Ids of the Item instances that were cloned
+    """
+    if get_setting("LOOKUP_TABLE"):
+        refresh_translation_lookups(item_ids, [language.pk])
+    object_ids = {}
+    for content_type_id, object_id in Item.objects.filter(pk__in=item_ids).values_list("content_type_id", "object_id"):
+        object_ids.setdefault(content_type_id, []).append(object_id)
+    content_types = [ContentType.objects.get_for_id(content_type_id) for content_type_id in object_ids]
+    for content_type in content_types:
+        model = content_type.model_class()
+        if model is not None and issubclass(model, SnapshotTranslatedModel):
+            model.rebuild_translation_snapshots(object_ids[content_type.pk])
+    if get_setting("BUNDLE_ON_WRITE") and content_types:
+        schedule_bundles({content_type.app_label for content_type in content_types}, [language.pk])
+
+
+def set_translation_texts(language, texts):
+    """
+    Description:
+        Writes the texts of many Items in a Language, with one "bulk_update" and one "bulk_create"
+        Existing Translation instances are updated, and missing ones (such as in sparse mode) are inserted
+        Since "post_save" is not sent, send "translations_bulk_saved" with the returned list if needed
+    Args:
+        language (Language): Language instance from this app
+        texts (dict): Texts to write, indexed by Item id
+    Returns:
+        list: The Translation instances that were written
+    """
+    existing = Translation.objects.filter(language=language, item_id__in=list(texts))
+    to_update = list(existing.only("pk", "item_id", "language_id"))
+    for translation in to_update:
+        translation.text = texts[translation.item_id]
+    found = {translation.item_id for translation in to_update}
+    to_create = [
+        Translation(item_id=item_id, language=language, text=text)
+        for item_id, text in texts.items()
+        if item_id not in found
+    ]
+    Translation.objects.bulk_update(to_update, ["text"])
+    Translation.objects.bulk_create(to_create, ignore_conflicts=True)
+    return to_update + to_create
+
+
+def _delete_by_chunks(queryset, chunk_size):
+    """
+    Deletes the rows of a QuerySet by chunks of ids, with raw DELETE queries (no collector, no signal)
+    This is the only place where we use the private "_raw_delete": "delete()" would load every row to send
+    the "post_delete" of our Translation receivers, which is exactly what our bulk deletes avoid
+    Callers must therefore delete the dependent rows first, and redo the work of the receivers themselves
+    """
+    count = 0
+    while True:
+        ids = list(queryset.values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return count
+        chunk = queryset.model._base_manager.filter(pk__in=ids)
+        count += chunk._raw_delete(chunk.db)
+
+
+def _remove_from_snapshots(model, field_name, chunk_size):
+    """Removes a field from the snapshots of all the objects of a SnapshotTranslatedModel, by chunks of objects"""
+    queryset = model._base_manager.order_by("pk").only("pk", "translation_snapshot")
+    cursor = None
+    while True:
+        chunk = queryset if cursor is None else queryset.filter(pk__gt=cursor)
+        objects = list(chunk[:chunk_size])
+        if not objects:
+            return
+        for obj in objects:
+            for texts in obj.translation_snapshot.values():
+                texts.pop(field_name, None)
+        model._base_manager.bulk_update(objects, ["translation_snapshot"])
+        cursor = objects[-1].pk
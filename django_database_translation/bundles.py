@@ -0,0 +1,205 @@
+# coding: utf-8
+"""
+Description:
+    Contains the logic used to build static JSON bundles of translations, to be served by a CDN
+    There is one bundle per application and Language, containing the translated fields of its objects:
+        {"model_name": {"object_id": {"field_name": "text"}}}
+    Each file is named after the hash of its content (ie "shop.fr-fr.1a2b3c4d5e6f.json"), so it can be cached forever
+    A "manifest.json" file gives the current file of each bundle, and bundles that did not change are not rewritten
+    Replaced files are kept, since old pages and CDN entries may still use them, until "prune_bundles" removes them
+    The manifest is updated under a lock file, so that concurrent builds do not lose each other's entries
+    With settings.DDT_BUNDLE_ON_WRITE, saving translations creates "bundle" TranslationJobs in the same transaction,
+    and the bundles are rebuilt by the "process_translation_jobs" worker, outside of the request
+Functions:
+    build_bundle: Returns the content of the bundle of an application, in a Language
+    prune_bundles: Deletes the replaced bundle files, once they have been replaced for long enough
+    schedule_bundles: Creates the jobs that rebuild the given bundles, unless they are already pending
+    write_bundles: Writes the bundles that changed, and updates the manifest, in a directory
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+# Django
+from django.core.exceptions import ImproperlyConfigured
+
+# Third-party
+
+# Local
+from .conf import get_setting
+from .models import Field, Language, TranslationJob
+from .utils import TranslatedJSONEncoder, translated_rows
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+# Name of the bundle files, as opposed to the manifest and the lock file
+_BUNDLE_FILENAME = re.compile(r"^.+\.[0-9a-f]{12}\.json$")
+
+
+def build_bundle(app_label, language):
+    """
+    Description:
+        Returns the content of the bundle of an application, in a Language
+        The texts of each model are fetched with the batched "translated_rows" path (with fallbacks)
+    Args:
+        app_label (str): Label of the application
+        language (Language): Language instance from this app
+    Returns:
+        dict: The translated fields of the objects, as {"model_name": {"object_id": {"field_name": "text"}}}
+    """
+    field_names = {}
+    for field in Field.objects.filter(content_type__app_label=app_label).select_related("content_type"):
+        model = field.content_type.model_class()
+        if model is not None:
+            field_names.setdefault(model, []).append(field.name)
+    bundle = {}
+    for model, names in field_names.items():
+        names = sorted(names)
+        rows = translated_rows(model._base_manager.order_by("pk"), [model._meta.pk.name] + names, language)
+        bundle[model._meta.model_name] = {str(row[0]): dict(zip(names, row[1:])) for row in rows}
+    return bundle
+
+
+def prune_bundles(directory, max_age=86400):
+    """
+    Description:
+        Deletes the bundle files that are not in the manifest anymore, once they have been replaced for long enough
+        When a file is replaced, its modification date is set to the date of its replacement (see "write_bundles")
+    Args:
+        directory (str): Path of the directory of the bundles
+        max_age (int, optional): Seconds a replaced file is kept. Defaults to 86400 (one day).
+    Returns:
+        int: The amount of deleted files
+    """
+    count = 0
+    limit = time.time() - max_age
+    with _lock_manifest(directory):
+        current = set(_read_manifest(directory).values())
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            if _BUNDLE_FILENAME.match(filename) and filename not in current and os.path.getmtime(path) < limit:
+                os.remove(path)
+                count += 1
+    return count
+
+
+def schedule_bundles(app_labels, language_ids):
+    """
+    Description:
+        Creates the "bundle" jobs that rebuild the given bundles, unless they are already pending
+        The jobs are created in the current transaction, so they are discarded if it is rolled back
+    Args:
+        app_labels (iterable): Labels of the applications
+        language_ids (iterable): Ids of the Language instances
+    """
+    if not get_setting("BUNDLE_DIR"):
+        raise ImproperlyConfigured("settings.DDT_BUNDLE_ON_WRITE requires settings.DDT_BUNDLE_DIR")
+    keys = {(app_label, language_id) for app_label in app_labels for language_id in language_ids}
+    pending = TranslationJob.objects.filter(
+        kind=TranslationJob.KIND_BUNDLE,
+        status=TranslationJob.STATUS_PENDING,
+        app_label__in={app_label for app_label, _ in keys},
+        language_id__in={language_id for _, language_id in keys},
+    )
+    keys -= set(pending.values_list("app_label", "language_id"))
+    TranslationJob.objects.bulk_create([
+        TranslationJob(kind=TranslationJob.KIND_BUNDLE, app_label=app_label, language_id=language_id)
+        for app_label, language_id in keys
+    ])
+
+
+def write_bundles(directory, app_labels=None, languages=None):
+    """
+    Description:
+        Writes the bundles that changed, and updates the manifest, in a directory
+        Files are written under a temporary name, then renamed, so a file is never read half-written
+        The replaced files are kept (see "prune_bundles"), so that old manifests and CDN entries still work
+    Args:
+        directory (str): Path of the directory of the bundles
+        app_labels (list, optional): Only build the bundles of those applications. Defaults to all of them.
+        languages (list, optional): Only build the bundles of those Language instances. Defaults to all of them.
+    Returns:
+        dict: The amount of "written" and "unchanged" bundles
+    """
+    os.makedirs(directory, exist_ok=True)
+    if app_labels is None:
+        app_labels = Field.objects.values_list("content_type__app_label", flat=True).distinct()
+    if languages is None:
+        languages = Language.objects.all()
+    manifest = _read_manifest(directory)
+    counts = {"written": 0, "unchanged": 0}
+    filenames = {}
+    for app_label in sorted(set(app_labels)):
+        for language in languages:
+            bundle = build_bundle(app_label, language)
+            content = json.dumps(bundle, cls=TranslatedJSONEncoder, ensure_ascii=False, sort_keys=True)
+            content = content.encode("utf-8")
+            key = "{}.{}".format(app_label, language.django_language_name)
+            filename = "{}.{}.json".format(key, hashlib.sha256(content).hexdigest()[:12])
+            if manifest.get(key) == filename and os.path.exists(os.path.join(directory, filename)):
+                counts["unchanged"] += 1
+                continue
+            _write_file(os.path.join(directory, filename), content)
+            filenames[key] = filename
+            counts["written"] += 1
+    if filenames:
+        # Read the manifest again under the lock, since another process may have changed it in the meantime
+        with _lock_manifest(directory):
+            manifest = _read_manifest(directory)
+            replaced = [manifest[key] for key, filename in filenames.items() if manifest.get(key, filename) != filename]
+            manifest.update(filenames)
+            content = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+            _write_file(os.path.join(directory, "manifest.json"), content)
+            # The replacement date is stored as the modification date, for "prune_bundles"
+            for filename in replaced:
+                path = os.path.join(directory, filename)
+                if os.path.exists(path):
+                    os.utime(path)
+    return counts
+
+
+@contextmanager
+def _lock_manifest(directory):
+    """
+    Holds an exclusive lock on the manifest of a directory, shared by all the processes of the machine
+    "fcntl" is only imported here, so that the app itself still works on systems without it (ie Windows)
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise ImproperlyConfigured("Writing translation bundles requires a POSIX system (for the 'fcntl' lock)")
+    with open(os.path.join(directory, "manifest.lock"), "w") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _read_manifest(directory):
+    """Returns the content of the manifest of a directory, or an empty dict if it does not exist yet"""
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _write_file(path, content):
+    """Writes a file under a unique temporary name, then renames it"""
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(content)
+    os.replace(temporary_path, path)
@@ -0,0 +1,65 @@
+# coding: utf-8
+"""
+Description:
+    Contains the settings of our app, and their default values
+    Each setting can be overridden in your "settings.py" by adding the "DDT_" prefix (ie "DDT_SPARSE_TRANSLATIONS")
+Settings:
+    ASYNC_FANOUT: New Field and Language instances create a TranslationJob instead of creating rows in the request
+    BACKFILL_RANGE_SIZE: With ASYNC_FANOUT, splits the job of a new Field into one job per range of primary keys
+    BATCH_LIMIT: Maximum amount of items and fields that can be requested at once from the "batch_translations" view
+    BATCH_PERMISSION: Permission name (or callable taking the request) required by "batch_translations" (None: public)
+    BUNDLE_DIR: Directory of the JSON bundles built by "build_translation_bundles"
+    BUNDLE_ON_WRITE: Saved translations create jobs that rebuild their JSON bundles (requires BUNDLE_DIR)
+    DEDUPLICATE_TEXTS: Stores each distinct translated text once, in the TranslationText table
+    DEFAULT_LANGUAGE_ID: Primary key of the Language used by the LanguageMiddleware when nothing else matches
+    LOOKUP_TABLE: Maintains the TranslationLookup table, and reads the texts from it
+    PIN_SECONDS: How long a client keeps reading from the primary after a write (with TranslationRouterMiddleware)
+    READ_DATABASES: Database aliases used by the TranslationRouter for reads
+    SPARSE_TRANSLATIONS: Only stores non-empty translations, instead of one row per Item and Language
+    TRACK_VERSIONS: Maintains the TranslationVersion table, used by the "translations_condition" decorator
+    WRITE_DATABASE: Database alias used by the TranslationRouter for writes (and pinned reads)
+Functions:
+    get_setting: Returns the value of one of our settings, or its default value if it was not overridden
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.conf import settings
+
+# Third-party
+
+# Local
+
+
+# --------------------------------------------------------------------------------
+# > Defaults
+# --------------------------------------------------------------------------------
+DEFAULTS = {
+    "ASYNC_FANOUT": False,
+    "BACKFILL_RANGE_SIZE": None,
+    "BATCH_LIMIT": 500,
+    "BATCH_PERMISSION": None,
+    "BUNDLE_DIR": None,
+    "BUNDLE_ON_WRITE": False,
+    "DEDUPLICATE_TEXTS": False,
+    "DEFAULT_LANGUAGE_ID": 1,
+    "LOOKUP_TABLE": False,
+    "PIN_SECONDS": 5,
+    "READ_DATABASES": [],
+    "SPARSE_TRANSLATIONS": False,
+    "TRACK_VERSIONS": False,
+    "WRITE_DATABASE": "default",
+}
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+def get_setting(name):
+    """Returns the value of one of our settings, or its default value if it was not overridden"""
+    return getattr(settings, "DDT_{}".format(name), DEFAULTS[name])
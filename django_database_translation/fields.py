@@ -2,7 +2,10 @@
 """
 Description:
     Contains helper functions and classes for models.Field instances
+Descriptors:
+    DeduplicatedTextDescriptor: Reads the text from the related deduplicated row when it is not stored in the column
 Fields:
+    DeduplicatedTextField: TextField that can store its value in a deduplicated table (see DDT_DEDUPLICATE_TEXTS)
     ForeignKeyCascade: ForeignKey set up for CASCADE 'on delete' with index
     NotEmptyCharField: Charfield that cannot be null nor an empty string
     TranslatableField: Field to use if your field must be translated. It will set a ForeignKey to our "Item" model.
@@ -16,15 +19,84 @@ Fields:
 
 # Django
 from django.db import models
+from django.db.models.query_utils import DeferredAttribute
 
 # Third-party
 
 # Local
+from .conf import get_setting
+
+
+# --------------------------------------------------------------------------------
+# > Descriptors
+# --------------------------------------------------------------------------------
+class DeduplicatedTextDescriptor(DeferredAttribute):
+    """
+    Reads the text from the related deduplicated row when it is not stored in the column
+    Rows loaded with an empty column and a reference are flagged by the model's "from_db" method
+    When the column was deferred (ie with "only"), the same check is done once it is loaded
+    The text is then read once (from the "select_related" cache, or with a query), and kept on the instance
+    """
+
+    def __get__(self, instance, cls=None):
+        """Returns the text of the column, or the one of the referenced row if the column was emptied"""
+        if instance is None:
+            return self
+        deferred = self.field.attname not in instance.__dict__
+        text = super().__get__(instance, cls)
+        ref_field = instance._meta.get_field(self.field.ref_field)
+        if deferred and text == "" and getattr(instance, ref_field.attname) is not None:
+            instance.__dict__["_deduplicated_text"] = True
+        if instance.__dict__.get("_deduplicated_text"):
+            text = getattr(instance, ref_field.name).text
+            instance.__dict__[self.field.attname] = text
+            instance.__dict__["_deduplicated_text"] = False
+        return text
+
+    def __set__(self, instance, value):
+        """Sets the text, which then no longer needs to be read from the referenced row"""
+        instance.__dict__[self.field.attname] = value
+        instance.__dict__["_deduplicated_text"] = False
 
 
 # --------------------------------------------------------------------------------
 # > Model Fields
 # --------------------------------------------------------------------------------
+class DeduplicatedTextField(models.TextField):
+    """
+    TextField that can store its value in a deduplicated table, with settings.DDT_DEDUPLICATE_TEXTS
+    The "ref_field" is a ForeignKey to a model with a "get_ids" classmethod, declared after this field
+    When saved, non-empty texts are stored in the related table, and the column is left empty
+    Otherwise, the text is stored in the column, and the reference is removed
+    """
+
+    descriptor_class = DeduplicatedTextDescriptor
+
+    def __init__(self, *args, ref_field="text_ref", **kwargs):
+        """Stores the name of the ForeignKey towards the deduplicated table"""
+        self.ref_field = ref_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        """Adds the 'ref_field' to the arguments used by the migrations"""
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["ref_field"] = self.ref_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        """Sets the reference of the instance, and returns the value of the column"""
+        ref_field = model_instance._meta.get_field(self.ref_field)
+        if model_instance.__dict__.get("_deduplicated_text"):
+            # Already stored in the related table (ie by "deduplicate_texts")
+            return ""
+        text = getattr(model_instance, self.attname)
+        if text and get_setting("DEDUPLICATE_TEXTS"):
+            setattr(model_instance, ref_field.attname, ref_field.related_model.get_ids([text])[text])
+            return ""
+        setattr(model_instance, ref_field.attname, None)
+        return text
+
+
 def ForeignKeyCascade(to, *args, **kwargs):
     """ForeignKey set up for CASCADE 'on delete' with index"""
     kwargs['db_index'] = True
@@ -22,6 +22,7 @@ from django import forms
 # Third-party
 
 # Local
+from .conf import get_setting
 from .models import Language
 
 
@@ -51,12 +52,24 @@ class DynamicTranslationForm(forms.ModelForm):
     def save(self, commit=True):
         """Overridden method to save the updated Translation texts"""
         if self.instance.pk:
+            sparse = get_setting("SPARSE_TRANSLATIONS")
             for translation in self.translations:
                 obj = translation["instance"]
                 fieldname = translation["fieldname"]
                 value = self.cleaned_data[fieldname]
+                # In sparse mode, empty texts are not stored
+                if sparse and not value and obj.pk is None:
+                    continue
+                if obj.pk is not None and obj.text == value:
+                    continue
                 obj.text = value
                 obj.save()
+                # The row is saved first, so that our receivers (like the snapshot) see the empty text
+                if sparse and not value:
+                    obj.delete()
+            # The snapshot was updated in the database by our signals, so we must not overwrite it
+            if hasattr(self.instance, "translation_snapshot"):
+                self.instance.refresh_from_db(fields=["translation_snapshot"])
         return super(DynamicTranslationForm, self).save(commit=commit)
 
     # ----------------------------------------
@@ -66,10 +79,11 @@ class DynamicTranslationForm(forms.ModelForm):
         """
         Finds all the Translation instances linked to our object, and stores their info in an attribute
         The attribute is a list of dict, each dict containing the information of one translation
+        Missing translations (such as in sparse mode) are built, and will only be saved if filled
         """
         obj = self.instance
         information = []
-        translations = obj.get_translations()
+        translations = obj.get_or_build_translations()
         for translation in translations:
             fieldname = create_translation_fieldname(translation)
             information.append({
@@ -135,5 +149,6 @@ def create_translation_fieldname(translation):
     """
     field = translation.item.field.name
     language = translation.language.name
-    fieldname = "{} in {} (id={})".format(field, language, translation.id)
+    translation_id = translation.id if translation.id is not None else "new"
+    fieldname = "{} in {} (id={})".format(field, language, translation_id)
     return fieldname
@@ -0,0 +1,164 @@
+# coding: utf-8
+"""
+Description:
+    Contains the logic used to process the TranslationJob queue
+    Each job is processed in chunks of primary keys, and each chunk is committed along with the job's cursor
+    If a worker crashes, the job resumes from its last committed chunk
+    The backfill of a Field can be split into ranges of primary keys, so that several workers share it
+Functions:
+    claim_job: Marks the oldest pending job as running, and returns it
+    enqueue_field_jobs: Creates the jobs of a new Field, split into ranges of primary keys if requested
+    enqueue_field_ranges: Creates one "field_range" job per range of primary keys of the Field's model
+    enqueue_job: Creates a new pending TranslationJob
+    get_job_queryset: Returns the QuerySet of the rows a job must go through
+    release_stale_jobs: Puts back in the queue the running jobs that have not progressed for a while
+    run_job: Processes a job chunk by chunk, until it is done or fails
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+from datetime import timedelta
+import traceback
+
+# Django
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+# Third-party
+
+# Local
+from .bulk import create_items, create_translations_for_language
+from .bundles import write_bundles
+from .conf import get_setting
+from .models import Item, TranslationJob
+from .routers import read_scope
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+def claim_job(**filters):
+    """
+    Marks the oldest pending job as running, and returns it (or None if the queue is empty)
+    The status is changed with a conditional UPDATE, so two workers can never claim the same job
+    The queue can be narrowed with filters, such as "claim_job(field=field)"
+    """
+    pending = TranslationJob.objects.filter(status=TranslationJob.STATUS_PENDING, **filters)
+    while True:
+        job = pending.order_by("pk").first()
+        if job is None:
+            return None
+        claimed = pending.filter(pk=job.pk).update(status=TranslationJob.STATUS_RUNNING, updated_at=timezone.now())
+        if claimed:
+            job.status = TranslationJob.STATUS_RUNNING
+            return job
+
+
+def enqueue_field_jobs(field):
+    """Creates the jobs of a new Field: one per range with settings.DDT_BACKFILL_RANGE_SIZE, or a single one"""
+    range_size = get_setting("BACKFILL_RANGE_SIZE")
+    if range_size:
+        return enqueue_field_ranges(field, range_size)
+    return [enqueue_job(TranslationJob.KIND_FIELD, field=field)]
+
+
+def enqueue_field_ranges(field, range_size):
+    """
+    Description:
+        Creates one "field_range" job per range of primary keys of the Field's model
+        The ranges are computed from the lowest and highest keys, so gaps only make some ranges smaller
+        Models without integer primary keys cannot be split, and get a single "field" job instead
+    Args:
+        field (Field): Field instance from this app
+        range_size (int): Amount of primary keys per range
+    Returns:
+        list: The created TranslationJob instances
+    """
+    model = field.content_type.model_class()
+    bounds = model._base_manager.aggregate(start=Min("pk"), end=Max("pk"))
+    if not isinstance(bounds["start"], int):
+        return [enqueue_job(TranslationJob.KIND_FIELD, field=field)]
+    jobs = [
+        TranslationJob(kind=TranslationJob.KIND_FIELD_RANGE, field=field, start_pk=start, end_pk=start + range_size - 1)
+        for start in range(bounds["start"], bounds["end"] + 1, range_size)
+    ]
+    return TranslationJob.objects.bulk_create(jobs)
+
+
+def enqueue_job(kind, field=None, language=None):
+    """Creates a new pending TranslationJob"""
+    return TranslationJob.objects.create(kind=kind, field=field, language=language)
+
+
+def get_job_queryset(job):
+    """Returns the QuerySet of the rows a job must go through: the model's objects for a Field, the Items for a Language"""
+    if job.kind == TranslationJob.KIND_FIELD:
+        return job.field.content_type.model_class()._base_manager.all()
+    if job.kind == TranslationJob.KIND_FIELD_RANGE:
+        objects = job.field.content_type.model_class()._base_manager.all()
+        return objects.filter(pk__gte=job.start_pk, pk__lte=job.end_pk)
+    return Item.objects.all()
+
+
+def release_stale_jobs(seconds, **filters):
+    """
+    Puts back in the queue the running jobs that have not progressed for the given amount of seconds
+    The jobs can be narrowed with filters, such as "release_stale_jobs(300, field=field)"
+    """
+    limit = timezone.now() - timedelta(seconds=seconds)
+    running = TranslationJob.objects.filter(status=TranslationJob.STATUS_RUNNING, updated_at__lt=limit, **filters)
+    return running.update(
+        status=TranslationJob.STATUS_PENDING
+    )
+
+
+def run_job(job, chunk_size=1000):
+    """
+    Description:
+        Processes a job chunk by chunk, until it is done or fails
+        Each chunk and the new cursor are committed in the same transaction
+        A "bundle" job is not chunked: it rewrites its bundle at once (see "write_bundles")
+        The job runs in a "read_scope", so its writes do not pin the worker to the primary database afterwards
+    Args:
+        job (TranslationJob): The job to process, which should already be marked as running
+        chunk_size (int, optional): Amount of rows per chunk. Defaults to 1000.
+    """
+    with read_scope():
+        _run_job(job, chunk_size)
+
+
+def _run_job(job, chunk_size):
+    """Does the work of 'run_job'"""
+    try:
+        if job.kind == TranslationJob.KIND_BUNDLE:
+            write_bundles(get_setting("BUNDLE_DIR"), [job.app_label], [job.language])
+        else:
+            queryset = get_job_queryset(job).order_by("pk")
+            if not job.total:
+                job.total = queryset.count()
+                job.save(update_fields=["total", "updated_at"])
+            while True:
+                with transaction.atomic():
+                    chunk = queryset
+                    if job.cursor is not None:
+                        chunk = chunk.filter(pk__gt=job.cursor)
+                    ids = list(chunk.values_list("pk", flat=True)[:chunk_size])
+                    if not ids:
+                        break
+                    if job.kind in (TranslationJob.KIND_FIELD, TranslationJob.KIND_FIELD_RANGE):
+                        create_items(job.field, ids)
+                    else:
+                        create_translations_for_language(job.language, ids)
+                    job.cursor = ids[-1]
+                    job.processed += len(ids)
+                    job.save(update_fields=["cursor", "processed", "updated_at"])
+        job.status = TranslationJob.STATUS_DONE
+        job.save(update_fields=["status", "updated_at"])
+    except Exception:
+        job.status = TranslationJob.STATUS_FAILED
+        job.error = traceback.format_exc()
+        job.save(update_fields=["status", "error", "updated_at"])
@@ -0,0 +1,270 @@
+# coding: utf-8
+"""
+Description:
+    Contains lazy translated values, used to batch the translation lookups of a whole render.
+    Each LazyTranslation registers its (item_id, language_id) pair in the TranslationLoader of the current thread.
+    The first time one of them is converted into a string, all the pending pairs are resolved with a single query.
+    Instances fetched by a TranslatedQuerySet share a TranslationBatch: reading a field on one of them registers
+    the same field for all of them, so a listing is resolved with a single query without any template tag.
+    Like "get_translations", each pair gets the first non-empty text from the fallback chain of its language.
+    The loader is emptied at the start of every request, so texts are never kept from one request to another.
+    Outside of requests (commands, workers), use "loader_scope" around each unit of work.
+    Saving or deleting a Translation through our models invalidates the resolved texts of every loader of the process.
+Classes:
+    LazyTranslation: Proxy for a translated text, only resolved when converted into a string
+    TranslatedValues: Gives access to the LazyTranslation of each translated field of an instance
+    TranslatedValuesDescriptor: Descriptor that returns a TranslatedValues object for the instance
+    TranslationBatch: Instances fetched together, whose translated fields are registered together
+    TranslationLoader: Stores the pending (item_id, language_id) pairs and resolves them in batch
+Functions:
+    get_loader: Returns the TranslationLoader of the current thread
+    invalidate_loaders: Makes every TranslationLoader of the process forget its resolved texts
+    reset_loader: Empties the TranslationLoader of the current thread
+Context Managers:
+    loader_scope: Empties the TranslationLoader of the current thread when entering and leaving the block
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+from contextlib import contextmanager
+import threading
+
+# Django
+from django.core.exceptions import FieldDoesNotExist
+from django.core.signals import request_started
+from django.dispatch import receiver
+from django.utils.translation import get_language
+
+# Third-party
+
+# Local
+
+
+# --------------------------------------------------------------------------------
+# > Classes
+# --------------------------------------------------------------------------------
+class LazyTranslation:
+    """
+    Proxy for a translated text, only resolved when converted into a string
+    Creating the proxy only registers its (item_id, language_id) pair in the loader
+    """
+
+    def __init__(self, loader, item_id, language_id):
+        """Registers the pair in the loader"""
+        self.loader = loader
+        self.item_id = item_id
+        self.language_id = language_id
+        loader.add(item_id, language_id)
+
+    def __str__(self):
+        """Resolves every pending pair of the loader (if needed) and returns our text"""
+        return self.loader.get(self.item_id, self.language_id)
+
+    def __repr__(self):
+        """Returns the item id and language id, to avoid triggering the query"""
+        return "<LazyTranslation item={} language={}>".format(self.item_id, self.language_id)
+
+    def __bool__(self):
+        """Allows the use of {% if %} in templates"""
+        return bool(str(self))
+
+    def __eq__(self, other):
+        """Compares the resolved text"""
+        return str(self) == str(other)
+
+    def __hash__(self):
+        """Hashes the resolved text"""
+        return hash(str(self))
+
+
+class TranslatedValues:
+    """
+    Gives access to the LazyTranslation of each translated field of an instance
+    Both 'values.name' and 'values["name"]' are supported, so it can be used in templates
+    """
+
+    def __init__(self, instance, language_id=None):
+        """Stores the instance and the language (defaults to the active django language)"""
+        self._instance = instance
+        self._language_id = language_id
+
+    def __getattr__(self, name):
+        """Returns the LazyTranslation for the given field name, which must be a ForeignKey to our Item model"""
+        from .models import Item
+        if name.startswith("_"):
+            raise AttributeError(name)
+        loader = get_loader()
+        try:
+            field = self._instance._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise AttributeError("{} has no field '{}'".format(self._instance.__class__.__name__, name))
+        if not field.many_to_one or field.related_model is not Item:
+            raise AttributeError("{}.{} is not a translated field".format(self._instance.__class__.__name__, name))
+        item_id = getattr(self._instance, field.attname, None)
+        language_id = self._language_id
+        if language_id is None:
+            language_id = loader.get_active_language_id()
+        batch = getattr(self._instance, "_translation_batch", None)
+        if batch is not None:
+            batch.register(loader, field, language_id)
+        return LazyTranslation(loader, item_id, language_id)
+
+    def __getitem__(self, name):
+        """Same as __getattr__, but raises a KeyError"""
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+
+class TranslatedValuesDescriptor:
+    """
+    Descriptor that returns a TranslatedValues object for the instance
+    Reading "product.translated.name" only uses the "name_id" column, and never loads the Item instance
+    """
+
+    def __get__(self, instance, owner):
+        """Returns the descriptor itself when called on the class"""
+        if instance is None:
+            return self
+        return TranslatedValues(instance)
+
+
+class TranslationBatch:
+    """
+    Instances fetched together, whose translated fields are registered together
+    Attached by TranslatedQuerySet to each instance it fetches, in their "_translation_batch" attribute
+    """
+
+    def __init__(self, instances):
+        """Stores the instances, and the (field name, language id) couples already registered"""
+        self.instances = instances
+        self.registered = set()
+
+    def register(self, loader, field, language_id):
+        """Registers the pair of every instance for this field and language, only the first time"""
+        key = (field.name, language_id)
+        if key in self.registered:
+            return
+        self.registered.add(key)
+        for instance in self.instances:
+            loader.add(getattr(instance, field.attname, None), language_id)
+
+
+class TranslationLoader:
+    """
+    Stores the pending (item_id, language_id) pairs and resolves them in batch
+    Resolved texts are kept in memory until the loader is reset, or until a Translation is written
+    """
+
+    def __init__(self):
+        """Creates an empty loader"""
+        self.pending = set()
+        self.resolved = {}
+        self.languages = {}
+        self.chains = {}
+        self.generation = _generation[0]
+
+    def add(self, item_id, language_id):
+        """Registers a pair to resolve, unless it is already known"""
+        key = (item_id, language_id)
+        if item_id is not None and language_id is not None and key not in self.resolved:
+            self.pending.add(key)
+
+    def get(self, item_id, language_id):
+        """Returns the text of a pair, resolving all pending pairs first if needed"""
+        if self.generation != _generation[0]:
+            # A Translation was written since our texts were resolved: they must be fetched again
+            self.generation = _generation[0]
+            self.resolved.clear()
+        key = (item_id, language_id)
+        if key not in self.resolved:
+            self.add(item_id, language_id)
+        if key in self.pending:
+            self.resolve()
+        return self.resolved.get(key, "")
+
+    def get_active_language_id(self):
+        """Returns the id of the Language matching the active django language (cached per loader)"""
+        language_name = get_language()
+        if language_name not in self.languages:
+            from .models import Language
+            self.languages[language_name] = (
+                Language.objects.filter(django_language_name__iexact=language_name)
+                .values_list("id", flat=True)
+                .first()
+            )
+        return self.languages[language_name]
+
+    def get_fallback_chain(self, language_id):
+        """Returns the fallback chain of a Language id (cached per loader)"""
+        if language_id not in self.chains:
+            from .models import Language
+            self.chains[language_id] = Language(id=language_id).get_fallback_chain()
+        return self.chains[language_id]
+
+    def reset(self):
+        """Forgets every pending and resolved pair"""
+        self.pending.clear()
+        self.resolved.clear()
+        self.languages.clear()
+        self.chains.clear()
+
+    def resolve(self):
+        """Fetches the texts of all the pending pairs with a single query, using the fallback chain of each language"""
+        from .lookups import get_non_empty_texts
+        pending = self.pending
+        self.pending = set()
+        chains = {language_id: self.get_fallback_chain(language_id) for _, language_id in pending}
+        item_ids = {item_id for item_id, _ in pending}
+        language_ids = {language_id for chain in chains.values() for language_id in chain}
+        rows = get_non_empty_texts(item_ids, language_ids)
+        texts = {(item_id, language_id): text for item_id, language_id, text in rows}
+        # Each pair gets the first text of its chain, and missing ones are resolved as empty strings
+        for item_id, language_id in pending:
+            chain_texts = (texts.get((item_id, chain_id)) for chain_id in chains[language_id])
+            self.resolved[(item_id, language_id)] = next((text for text in chain_texts if text is not None), "")
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+_local = threading.local()
+# Incremented on every write of a Translation, so that the loaders of all the threads drop their resolved texts
+_generation = [0]
+
+
+def get_loader():
+    """Returns the TranslationLoader of the current thread"""
+    loader = getattr(_local, "loader", None)
+    if loader is None:
+        loader = TranslationLoader()
+        _local.loader = loader
+    return loader
+
+
+def invalidate_loaders():
+    """Makes every TranslationLoader of the process forget its resolved texts (the pending pairs are kept)"""
+    _generation[0] += 1
+
+
+@receiver(request_started)
+def reset_loader(sender=None, **kwargs):
+    """Empties the TranslationLoader of the current thread"""
+    get_loader().reset()
+
+
+# --------------------------------------------------------------------------------
+# > Context Managers
+# --------------------------------------------------------------------------------
+@contextmanager
+def loader_scope():
+    """Empties the TranslationLoader of the current thread when entering and leaving the block (ie in a worker)"""
+    reset_loader()
+    try:
+        yield get_loader()
+    finally:
+        reset_loader()
@@ -0,0 +1,111 @@
+# coding: utf-8
+"""
+Description:
+    Contains the logic used to maintain and read the TranslationLookup table (see settings.DDT_LOOKUP_TABLE)
+    It is a denormalised copy of the non-empty translations, keyed by language, content type, object id and field name
+    Reads can then use a single narrow table, instead of joining Item and Translation
+    Rows are refreshed per Item: the old rows are deleted, and the current non-empty translations are inserted again
+Functions:
+    delete_translation_lookups: Deletes the lookup rows of the given Items, in the given Languages
+    get_non_empty_texts: Returns the non-empty texts of the given Items and Languages, from the lookup table if enabled
+    rebuild_translation_lookups: Rebuilds the whole table, by chunks of Items
+    refresh_translation_lookups: Copies the current translations of the given Items into the table
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.db import transaction
+
+# Third-party
+
+# Local
+from .conf import get_setting
+from .models import Item, Translation, TranslationLookup
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+def delete_translation_lookups(item_ids, language_ids=None):
+    """Deletes the lookup rows of the given Items, in the given Languages (or all of them)"""
+    lookups = TranslationLookup.objects.filter(item_id__in=item_ids)
+    if language_ids is not None:
+        lookups = lookups.filter(language_id__in=language_ids)
+    lookups._raw_delete(lookups.db)
+
+
+def get_non_empty_texts(item_ids, language_ids):
+    """
+    Description:
+        Returns the non-empty texts of the given Items, in the given Languages, using a single query
+        With settings.DDT_LOOKUP_TABLE, they are read from the TranslationLookup table instead of Translation
+    Args:
+        item_ids (iterable): Ids of Item instances from this app
+        language_ids (iterable): Ids of Language instances from this app
+    Returns:
+        QuerySet: (item_id, language_id, text) tuples
+    """
+    if get_setting("LOOKUP_TABLE"):
+        lookups = TranslationLookup.objects.filter(item_id__in=item_ids, language_id__in=language_ids)
+        return lookups.values_list("item_id", "language_id", "text")
+    translations = Translation.objects.filter(item_id__in=item_ids, language_id__in=language_ids).non_empty()
+    return translations.with_text().values_list("item_id", "language_id", "full_text")
+
+
+def rebuild_translation_lookups(chunk_size=5000):
+    """
+    Description:
+        Rebuilds the whole TranslationLookup table, by chunks of Items (each chunk in its own transaction)
+    Args:
+        chunk_size (int, optional): Amount of Items per chunk. Defaults to 5000.
+    Returns:
+        int: The amount of lookup rows in the table
+    """
+    cursor = None
+    while True:
+        items = Item.objects.order_by("pk")
+        if cursor is not None:
+            items = items.filter(pk__gt=cursor)
+        item_ids = list(items.values_list("pk", flat=True)[:chunk_size])
+        if not item_ids:
+            break
+        with transaction.atomic():
+            refresh_translation_lookups(item_ids)
+        cursor = item_ids[-1]
+    return TranslationLookup.objects.count()
+
+
+def refresh_translation_lookups(item_ids, language_ids=None):
+    """
+    Description:
+        Copies the current non-empty translations of the given Items into the TranslationLookup table
+        The old rows are deleted, and the new ones are inserted with a single "bulk_create"
+        Rows inserted meanwhile by a concurrent refresh are kept, instead of raising an IntegrityError
+    Args:
+        item_ids (list): Ids of Item instances from this app
+        language_ids (list, optional): Only refresh those languages. Defaults to None (all of them).
+    """
+    item_ids = list(item_ids)
+    delete_translation_lookups(item_ids, language_ids)
+    translations = Translation.objects.filter(item_id__in=item_ids).non_empty().with_text()
+    if language_ids is not None:
+        translations = translations.filter(language_id__in=language_ids)
+    rows = translations.values_list(
+        "language_id", "item__content_type_id", "item__object_id", "item__field__name", "item_id", "full_text"
+    )
+    TranslationLookup.objects.bulk_create([
+        TranslationLookup(
+            language_id=language_id,
+            content_type_id=content_type_id,
+            object_id=object_id,
+            field_name=field_name,
+            item_id=item_id,
+            text=text,
+        )
+        for language_id, content_type_id, object_id, field_name, item_id, text in rows
+    ], ignore_conflicts=True)
@@ -0,0 +1,125 @@
+# coding: utf-8
+"""
+Description:
+    Management command that finds and repairs the inconsistencies left by interrupted signals
+    For each Field, three kinds of problems are detected with set-based (anti-join) queries:
+        - objects whose translated field is NULL (missing Item, or Item key not written back)
+        - Items whose object no longer exists (orphans)
+        - Items missing a Translation in some Language (only outside of sparse mode)
+    Repairs are done in bulk batches, using the helpers from "bulk.py"
+Usage:
+    python manage.py audit_translations [--dry-run] [--batch-size 5000]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+
+# Third-party
+
+# Local
+from ...bulk import create_items, create_translations_for_language
+from ...conf import get_setting
+from ...models import Field, Item, Language, Translation
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Finds and repairs the inconsistencies left by interrupted signals"""
+
+    help = "Finds (and repairs, unless --dry-run) missing Items, orphan Items, and missing Translations"
+
+    def add_arguments(self, parser):
+        """Allows to only report the problems, and to choose the batch size"""
+        parser.add_argument("--dry-run", action="store_true", help="Only reports the problems")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Amount of rows repaired per batch")
+
+    def handle(self, *args, **options):
+        """Audits each Field, and prints a report"""
+        dry_run = options["dry_run"]
+        batch_size = options["batch_size"]
+        languages = list(Language.objects.all())
+        check_translations = not get_setting("SPARSE_TRANSLATIONS")
+        self.problems = 0
+        for field in Field.objects.select_related("content_type"):
+            model = field.content_type.model_class()
+            if model is None:
+                self.stderr.write("{}: model not found, skipped".format(field))
+                continue
+            # Objects without Item
+            missing_items = self.get_objects_without_item(model, field)
+            count = self.repair(missing_items, lambda ids: create_items(field, ids), dry_run, batch_size)
+            self.report(field, "objects without item", count, dry_run)
+            # Orphan Items
+            orphans = self.get_orphan_items(model, field)
+            count = self.repair(orphans, lambda ids: Item.objects.filter(pk__in=ids).delete(), dry_run, batch_size)
+            self.report(field, "orphan items", count, dry_run)
+            # Missing Translations
+            if check_translations:
+                for language in languages:
+                    missing_translations = self.get_items_without_translation(field, language)
+                    repair = lambda ids, language=language: create_translations_for_language(language, ids)
+                    count = self.repair(missing_translations, repair, dry_run, batch_size)
+                    self.report(field, "items without {} translation".format(language), count, dry_run)
+        if not self.problems:
+            self.stdout.write("No inconsistency found")
+
+    # ----------------------------------------
+    # Detection
+    # ----------------------------------------
+    @staticmethod
+    def get_items_without_translation(field, language):
+        """Returns the ids of the Items of a Field that have no Translation in the given Language"""
+        translations = Translation.objects.filter(item=OuterRef("pk"), language=language)
+        return Item.objects.filter(field=field).filter(~Exists(translations)).values_list("pk", flat=True)
+
+    @staticmethod
+    def get_objects_without_item(model, field):
+        """Returns the ids of the objects whose translated field is NULL"""
+        attname = model._meta.get_field(field.name).attname
+        return model._base_manager.filter(**{attname: None}).values_list("pk", flat=True)
+
+    @staticmethod
+    def get_orphan_items(model, field):
+        """Returns the ids of the Items of a Field whose object no longer exists"""
+        objects = model._base_manager.filter(pk=OuterRef("object_id"))
+        return Item.objects.filter(field=field).filter(~Exists(objects)).values_list("pk", flat=True)
+
+    # ----------------------------------------
+    # Repair and report
+    # ----------------------------------------
+    @staticmethod
+    def repair(ids_queryset, function, dry_run, batch_size):
+        """
+        Calls the function on batches of ids until the queryset is empty, and returns the amount of problems found
+        Repaired rows no longer match the queryset, so we always take the first batch
+        """
+        if dry_run:
+            return ids_queryset.count()
+        count = 0
+        previous_ids = None
+        while True:
+            ids = list(ids_queryset.order_by("pk")[:batch_size])
+            if not ids:
+                break
+            if ids == previous_ids:
+                raise CommandError("Could not repair the rows {}".format(ids))
+            function(ids)
+            previous_ids = ids
+            count += len(ids)
+        return count
+
+    def report(self, field, label, count, dry_run):
+        """Writes one line of the report, if a problem was found"""
+        self.problems += count
+        if count:
+            action = "found" if dry_run else "repaired"
+            self.stdout.write("{}: {} {} {}".format(field, count, label, action))
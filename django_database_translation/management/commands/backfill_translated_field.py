@@ -0,0 +1,97 @@
+# coding: utf-8
+"""
+Description:
+    Management command that backfills the Items of a Field, using a pool of processes
+    The primary keys of the Field's model are split into ranges, each one stored as a "field_range" TranslationJob
+    Each process claims a range, and processes it chunk by chunk with its own database connection
+    Finished ranges are kept as done, so running the command again only retries the failed or unfinished ones
+    The processes are forked from the command, which requires a POSIX system
+Usage:
+    python manage.py backfill_translated_field app_label.Model field_name [--processes 4] [--range-size 100000]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# Third-party
+
+# Local
+from ...jobs import claim_job, enqueue_field_ranges, release_stale_jobs, run_job
+from ...models import Field, TranslationJob
+from ...utils import get_translated_field
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+def work(field_id, chunk_size):
+    """Processes the ranges of a Field until none is pending (in a child process), and returns the amount processed"""
+    processed = 0
+    try:
+        while True:
+            job = claim_job(kind=TranslationJob.KIND_FIELD_RANGE, field_id=field_id)
+            if job is None:
+                break
+            run_job(job, chunk_size)
+            processed += 1
+    finally:
+        connections.close_all()
+    return processed
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Backfills the Items of a Field, using a pool of processes"""
+
+    help = "Creates the Items of a Field for every object of its model, splitting the work into ranges of primary keys"
+
+    def add_arguments(self, parser):
+        """Requires the model and field names, and allows to configure the pool, the ranges, and the chunks"""
+        parser.add_argument("model", help="Model of the Field, as 'app_label.Model'")
+        parser.add_argument("field_name", help="Name of the Field")
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(), help="Amount of workers")
+        parser.add_argument("--range-size", type=int, default=100000, help="Amount of primary keys per range")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Amount of rows per chunk")
+        parser.add_argument("--retry-failed", action="store_true", help="Puts the failed ranges back in the queue")
+        parser.add_argument("--stale-after", type=int, default=300, help="Seconds before a running range is resumed")
+
+    def handle(self, *args, **options):
+        """Creates the ranges if needed, processes them in parallel, and prints a report"""
+        try:
+            field = get_translated_field(options["model"], options["field_name"])
+        except Field.DoesNotExist as error:
+            raise CommandError(error)
+        ranges = TranslationJob.objects.filter(kind=TranslationJob.KIND_FIELD_RANGE, field=field)
+        if options["retry_failed"]:
+            ranges.filter(status=TranslationJob.STATUS_FAILED).update(status=TranslationJob.STATUS_PENDING, error="")
+        release_stale_jobs(options["stale_after"], kind=TranslationJob.KIND_FIELD_RANGE, field=field)
+        if not ranges.exists():
+            # The ranges replace the single job created by DDT_ASYNC_FANOUT
+            TranslationJob.objects.filter(
+                kind=TranslationJob.KIND_FIELD, field=field, status=TranslationJob.STATUS_PENDING
+            ).delete()
+            enqueue_field_ranges(field, options["range_size"])
+        # Forked processes must not share the connections of their parent
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=options["processes"], mp_context=context) as executor:
+            futures = [
+                executor.submit(work, field.pk, options["chunk_size"])
+                for _ in range(options["processes"])
+            ]
+            processed = sum(future.result() for future in futures)
+        self.stdout.write("{} ranges processed".format(processed))
+        failed = ranges.filter(status=TranslationJob.STATUS_FAILED).count()
+        if failed:
+            raise CommandError("{} ranges failed, use --retry-failed to process them again".format(failed))
@@ -0,0 +1,60 @@
+# coding: utf-8
+"""
+Description:
+    Management command that builds the static JSON bundles of translations (see "bundles.py")
+    There is one content-hashed file per application and Language, and a "manifest.json" file listing them
+    Bundles whose content did not change are not rewritten
+    With --prune, the files replaced for more than --prune-after seconds are deleted
+Usage:
+    python manage.py build_translation_bundles [--output static/translations] [--app shop] [--language fr-fr] [--prune]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+# Third-party
+
+# Local
+from ...bundles import prune_bundles, write_bundles
+from ...conf import get_setting
+from ...models import Language
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Builds the static JSON bundles of translations"""
+
+    help = "Builds one content-hashed JSON file per application and Language, with a manifest"
+
+    def add_arguments(self, parser):
+        """Allows to choose the directory, and to restrict the applications and Languages"""
+        parser.add_argument("--output", help="Directory of the bundles (defaults to settings.DDT_BUNDLE_DIR)")
+        parser.add_argument("--app", action="append", dest="apps", help="Only builds this application (repeatable)")
+        parser.add_argument(
+            "--language", action="append", dest="languages", help="Only builds this django language name (repeatable)"
+        )
+        parser.add_argument("--prune", action="store_true", help="Deletes the files replaced for long enough")
+        parser.add_argument(
+            "--prune-after", type=int, default=86400, help="Seconds a replaced file is kept, with --prune"
+        )
+
+    def handle(self, *args, **options):
+        """Builds the bundles (and prunes the replaced files), and prints how many were written"""
+        directory = options["output"] or get_setting("BUNDLE_DIR")
+        if not directory:
+            raise CommandError("Use --output, or set settings.DDT_BUNDLE_DIR")
+        languages = None
+        if options["languages"]:
+            languages = list(Language.objects.filter(django_language_name__in=options["languages"]))
+        counts = write_bundles(directory, options["apps"], languages)
+        self.stdout.write("{} bundles written, {} unchanged".format(counts["written"], counts["unchanged"]))
+        if options["prune"]:
+            self.stdout.write("{} replaced files deleted".format(prune_bundles(directory, options["prune_after"])))
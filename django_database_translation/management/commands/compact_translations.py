@@ -0,0 +1,49 @@
+# coding: utf-8
+"""
+Description:
+    Management command that deletes the empty Translation rows, to switch an existing database to sparse mode
+    Rows are deleted in chunks of primary keys, to keep each transaction short, and without sending any signal
+    (see "delete_empty_translations")
+Usage:
+    python manage.py compact_translations [--chunk-size 10000] [--dry-run]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+# Third-party
+
+# Local
+from ...bulk import delete_empty_translations
+from ...conf import get_setting
+from ...models import Translation
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Deletes the empty Translation rows, to switch an existing database to sparse mode"""
+
+    help = "Deletes all the empty Translation rows (requires settings.DDT_SPARSE_TRANSLATIONS)"
+
+    def add_arguments(self, parser):
+        """Allows to choose the chunk size, and to only count the rows"""
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Amount of rows deleted per query")
+        parser.add_argument("--dry-run", action="store_true", help="Only counts the empty rows")
+
+    def handle(self, *args, **options):
+        """Deletes the empty rows chunk by chunk"""
+        if not get_setting("SPARSE_TRANSLATIONS"):
+            raise CommandError("Enable settings.DDT_SPARSE_TRANSLATIONS before compacting the translations")
+        if options["dry_run"]:
+            self.stdout.write("{} empty translations would be deleted".format(Translation.objects.empty().count()))
+            return
+        deleted = delete_empty_translations(options["chunk_size"])
+        self.stdout.write("{} empty translations deleted".format(deleted))
@@ -0,0 +1,123 @@
+# coding: utf-8
+"""
+Description:
+    Management command that converts an existing text column into a translated field, by chunks of objects
+    The model must temporarily have both fields: the old text column, and the new TranslatedField
+    For each chunk of objects whose new field is still NULL:
+        - the Items are created in bulk, and their keys are written back (see "bulk.create_items")
+        - the old texts are copied into the translations of the source Language
+    The Field instance is inserted without its signal, so the whole table is never processed at once
+    Each chunk is committed on its own: if the command is interrupted, running it again resumes the work
+    Objects created while the command runs get an empty Item from our signals, so a final pass copies the old texts
+    of the objects whose translation in the source Language is still empty
+    The texts are written in the Language given by "--language", or in settings.DDT_DEFAULT_LANGUAGE_ID
+Usage:
+    python manage.py convert_to_translated_field app_label.Model old_field new_field [--language 1]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+# Third-party
+
+# Local
+from ...bulk import create_items, set_translation_texts
+from ...conf import get_setting
+from ...models import Field, Item, Language, Translation
+from ...signals import translations_bulk_saved
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Converts an existing text column into a translated field, by chunks of objects"""
+
+    help = "Copies the texts of an existing column into the Translations of a new TranslatedField, by chunks"
+
+    def add_arguments(self, parser):
+        """Requires the model and both field names, and allows to choose the source Language and the chunk size"""
+        parser.add_argument("model", help="Model to convert, as 'app_label.Model'")
+        parser.add_argument("old_field", help="Name of the existing text field")
+        parser.add_argument("new_field", help="Name of the new TranslatedField")
+        parser.add_argument("--language", type=int, help="Id of the Language of the texts")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Amount of objects per chunk")
+
+    def handle(self, *args, **options):
+        """Creates the Field if needed, then converts the objects chunk by chunk"""
+        model = self.get_model(options["model"])
+        old_field, new_field = options["old_field"], options["new_field"]
+        try:
+            model._meta.get_field(old_field)
+            attname = model._meta.get_field(new_field).attname
+        except FieldDoesNotExist as error:
+            raise CommandError(error)
+        language_id = options["language"] or get_setting("DEFAULT_LANGUAGE_ID")
+        language = Language.objects.filter(pk=language_id).first()
+        if language is None:
+            raise CommandError("No Language found with the id {}".format(language_id))
+        field = self.get_or_create_field(model, new_field)
+        objects = model._base_manager.filter(**{attname: None})
+        self.convert_by_chunks(field, language, objects, old_field, options["chunk_size"])
+        # Catch-up pass, for the objects that got an empty Item from our signals in the meantime
+        filled = Translation.objects.filter(item=OuterRef(attname), language=language).non_empty()
+        missed = model._base_manager.exclude(**{attname: None}).exclude(**{old_field: ""}).exclude(**{old_field: None})
+        missed = missed.filter(~Exists(filled))
+        self.convert_by_chunks(field, language, missed, old_field, options["chunk_size"])
+        self.stdout.write("{}: done".format(field))
+
+    def convert_by_chunks(self, field, language, objects, old_field, chunk_size):
+        """Converts the objects of a QuerySet chunk by chunk, each one in its own transaction"""
+        objects = objects.order_by("pk")
+        total = objects.count()
+        converted = 0
+        cursor = None
+        while True:
+            chunk = objects if cursor is None else objects.filter(pk__gt=cursor)
+            rows = list(chunk.values_list("pk", old_field)[:chunk_size])
+            if not rows:
+                break
+            with transaction.atomic():
+                self.convert(field, language, rows)
+            cursor = rows[-1][0]
+            converted += len(rows)
+            self.stdout.write("{}/{} objects converted".format(converted, total))
+
+    @staticmethod
+    def convert(field, language, rows):
+        """Creates the Items of a chunk of objects, and copies their texts into the source Language"""
+        object_ids = [pk for pk, text in rows]
+        create_items(field, object_ids)
+        items = Item.objects.filter(field=field, object_id__in=object_ids)
+        item_ids = dict(items.values_list("object_id", "pk"))
+        texts = {item_ids[pk]: text for pk, text in rows if text}
+        if texts:
+            translations = set_translation_texts(language, texts)
+            translations_bulk_saved.send(sender=Translation, translations=translations)
+
+    @staticmethod
+    def get_model(label):
+        """Returns the model matching the 'app_label.Model' label"""
+        try:
+            return apps.get_model(label)
+        except (LookupError, ValueError):
+            raise CommandError("No model found for '{}'".format(label))
+
+    @staticmethod
+    def get_or_create_field(model, name):
+        """Returns the Field instance of the new field, inserting it without sending 'post_save'"""
+        content_type = ContentType.objects.get_for_model(model, for_concrete_model=False)
+        # Our manager blocks "bulk_create" to protect the signals, which we replace with our chunks
+        Field._base_manager.bulk_create([Field(content_type=content_type, name=name)], ignore_conflicts=True)
+        return Field.objects.get(content_type=content_type, name=name)
@@ -0,0 +1,70 @@
+# coding: utf-8
+"""
+Description:
+    Management command that moves the existing translated texts into the TranslationText table
+    Each chunk of translations is converted with a few bulk queries, in its own transaction
+    Then the TranslationText rows that are no longer used are deleted
+    With "--restore", the texts are copied back into the Translation table instead (before disabling the setting)
+    Texts are never deleted when a translation changes, so run it with "--prune-only" regularly (ie daily)
+    to delete the TranslationText rows that are no longer used
+Usage:
+    python manage.py deduplicate_translation_texts [--chunk-size 5000] [--restore | --prune-only]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+# Third-party
+
+# Local
+from ...conf import get_setting
+from ...models import Translation, TranslationText
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Moves the existing translated texts into the TranslationText table (or back with --restore)"""
+
+    help = "Deduplicates the existing translated texts (requires settings.DDT_DEDUPLICATE_TEXTS)"
+
+    def add_arguments(self, parser):
+        """Allows to choose the chunk size, and the direction"""
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Amount of translations per chunk")
+        parser.add_argument("--restore", action="store_true", help="Copies the texts back into the Translation table")
+        parser.add_argument("--prune-only", action="store_true", help="Only deletes the unused texts")
+
+    def handle(self, *args, **options):
+        """Converts the translations chunk by chunk, then deletes the unused texts"""
+        enabled = get_setting("DEDUPLICATE_TEXTS")
+        if options["restore"] and enabled:
+            raise CommandError("Disable settings.DDT_DEDUPLICATE_TEXTS before restoring the texts")
+        if not options["restore"] and not enabled:
+            raise CommandError("Enable settings.DDT_DEDUPLICATE_TEXTS before deduplicating the texts")
+        if options["restore"]:
+            rows = Translation.objects.filter(text="", text_ref__isnull=False)
+        else:
+            rows = Translation.objects.exclude(text="")
+        count = 0
+        while not options["prune_only"]:
+            chunk = list(rows.select_related("text_ref").order_by("pk")[:options["chunk_size"]])
+            if not chunk:
+                break
+            with transaction.atomic():
+                # The texts are read before being moved (see DeduplicatedTextDescriptor)
+                for translation in chunk:
+                    translation.text = translation.text
+                Translation.objects.bulk_update(chunk, ["text"])
+            count += len(chunk)
+        unused = TranslationText.objects.filter(~Exists(Translation.objects.filter(text_ref=OuterRef("pk"))))
+        deleted, _ = unused.delete()
+        self.stdout.write("{} translations converted, {} unused texts deleted".format(count, deleted))
@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+Description:
+    Management command that deletes a Field, its Items and their Translations with set-based queries
+    Unlike "Field.delete()", nothing is loaded in memory: the model's column is set to NULL with one UPDATE,
+    then the Translations and the Items are deleted by chunks (see "bulk.delete_field")
+    If it is interrupted, running it again finishes the work
+Usage:
+    python manage.py delete_translated_field app_label.Model field_name [--chunk-size 5000] [--no-input]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+# Third-party
+
+# Local
+from ...bulk import delete_field
+from ...models import Field
+from ...utils import get_translated_field
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Deletes a Field, its Items and their Translations with set-based queries"""
+
+    help = "Deletes a Field, its Items and their Translations, without loading them in memory"
+
+    def add_arguments(self, parser):
+        """Requires the model and field names, and allows to choose the chunk size"""
+        parser.add_argument("model", help="Model of the Field, as 'app_label.Model'")
+        parser.add_argument("field_name", help="Name of the Field")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Amount of rows deleted per query")
+        parser.add_argument(
+            "--no-input", "--noinput", action="store_false", dest="interactive", help="Does not ask for confirmation"
+        )
+
+    def handle(self, *args, **options):
+        """Asks for confirmation, deletes the Field, and prints what was removed"""
+        try:
+            field = get_translated_field(options["model"], options["field_name"])
+        except Field.DoesNotExist as error:
+            raise CommandError(error)
+        if options["interactive"]:
+            answer = input("This will delete '{}' and all of its translations. Type 'yes' to continue: ".format(field))
+            if answer != "yes":
+                raise CommandError("Deletion cancelled")
+        counts = delete_field(field, options["chunk_size"])
+        self.stdout.write(
+            "{}: {} objects updated, {} translations and {} items deleted".format(
+                field, counts["objects"], counts["translations"], counts["items"]
+            )
+        )
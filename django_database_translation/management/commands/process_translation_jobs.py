@@ -0,0 +1,78 @@
+# coding: utf-8
+"""
+Description:
+    Management command that processes the TranslationJob queue, using a pool of threads
+    Each thread claims a pending job, processes it chunk by chunk, and moves on to the next one
+    Running jobs that have not progressed for a while (ie after a crash) are put back in the queue first
+Usage:
+    python manage.py process_translation_jobs [--threads 4] [--chunk-size 1000] [--loop] [--retry-failed]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+# Third-party
+
+# Local
+from ...jobs import claim_job, release_stale_jobs, run_job
+from ...models import TranslationJob
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Processes the TranslationJob queue, using a pool of threads"""
+
+    help = "Processes the pending translation jobs created by Field and Language (see DDT_ASYNC_FANOUT)"
+
+    def add_arguments(self, parser):
+        """Allows to configure the pool, the chunks, and how long the worker runs"""
+        parser.add_argument("--threads", type=int, default=1, help="Amount of jobs processed in parallel")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Amount of rows per chunk")
+        parser.add_argument("--loop", action="store_true", help="Keeps waiting for new jobs instead of exiting")
+        parser.add_argument("--sleep", type=float, default=5, help="Seconds between two polls with --loop")
+        parser.add_argument("--retry-failed", action="store_true", help="Puts the failed jobs back in the queue")
+        parser.add_argument("--stale-after", type=int, default=300, help="Seconds before a running job is resumed")
+
+    def handle(self, *args, **options):
+        """Starts the threads, and waits for them to finish"""
+        if options["retry_failed"]:
+            TranslationJob.objects.filter(status=TranslationJob.STATUS_FAILED).update(
+                status=TranslationJob.STATUS_PENDING, error=""
+            )
+        while True:
+            release_stale_jobs(options["stale_after"])
+            with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                futures = [executor.submit(self.work, options["chunk_size"]) for _ in range(options["threads"])]
+                processed = sum(future.result() for future in futures)
+            if processed:
+                self.stdout.write("{} jobs processed".format(processed))
+            if not options["loop"]:
+                break
+            time.sleep(options["sleep"])
+
+    @staticmethod
+    def work(chunk_size):
+        """Processes jobs until the queue is empty, and returns the amount of processed jobs"""
+        processed = 0
+        try:
+            while True:
+                job = claim_job()
+                if job is None:
+                    break
+                run_job(job, chunk_size)
+                processed += 1
+        finally:
+            # Each thread has its own database connection
+            connection.close()
+        return processed
@@ -0,0 +1,43 @@
+# coding: utf-8
+"""
+Description:
+    Management command that rebuilds the TranslationLookup table (see settings.DDT_LOOKUP_TABLE)
+    Items are processed in chunks, each one refreshed in its own transaction, so the table stays readable
+Usage:
+    python manage.py rebuild_translation_lookups [--chunk-size 5000]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+# Third-party
+
+# Local
+from ...conf import get_setting
+from ...lookups import rebuild_translation_lookups
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Rebuilds the TranslationLookup table"""
+
+    help = "Rebuilds the denormalised TranslationLookup table (requires settings.DDT_LOOKUP_TABLE)"
+
+    def add_arguments(self, parser):
+        """Allows to choose the chunk size"""
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Amount of Items per chunk")
+
+    def handle(self, *args, **options):
+        """Rebuilds the table chunk by chunk"""
+        if not get_setting("LOOKUP_TABLE"):
+            raise CommandError("settings.DDT_LOOKUP_TABLE must be enabled, or the table will not be kept up to date")
+        count = rebuild_translation_lookups(options["chunk_size"])
+        self.stdout.write("{} lookup rows rebuilt".format(count))
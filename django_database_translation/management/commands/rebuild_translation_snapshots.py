@@ -0,0 +1,79 @@
+# coding: utf-8
+"""
+Description:
+    Management command that rebuilds the "translation_snapshot" column of every SnapshotTranslatedModel
+    Objects are processed in chunks: one query fetches the translations of a chunk, and one bulk_update saves it
+Usage:
+    python manage.py rebuild_translation_snapshots [app_label.ModelName ...] [--chunk-size 1000]
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+# Third-party
+
+# Local
+from ...models import SnapshotTranslatedModel
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Rebuilds the "translation_snapshot" column of every SnapshotTranslatedModel"""
+
+    help = "Rebuilds the translation snapshots of the models that inherit from SnapshotTranslatedModel"
+
+    def add_arguments(self, parser):
+        """Allows to restrict the models, and to choose the chunk size"""
+        parser.add_argument("models", nargs="*", help="Models to rebuild, as 'app_label.ModelName'")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Amount of objects per query")
+
+    def handle(self, *args, **options):
+        """Rebuilds the snapshots of each model, chunk by chunk"""
+        models = self.get_models(options["models"])
+        for model in models:
+            count = self.rebuild_model(model, options["chunk_size"])
+            self.stdout.write("{}: {} snapshots rebuilt".format(model._meta.label, count))
+
+    @staticmethod
+    def get_models(labels):
+        """Returns the requested models, or all the SnapshotTranslatedModel if none were given"""
+        if not labels:
+            return [model for model in apps.get_models() if issubclass(model, SnapshotTranslatedModel)]
+        models = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError("Unknown model '{}'".format(label))
+            if not issubclass(model, SnapshotTranslatedModel):
+                raise CommandError("{} does not inherit from SnapshotTranslatedModel".format(label))
+            models.append(model)
+        return models
+
+    @staticmethod
+    def rebuild_model(model, chunk_size):
+        """Rebuilds the snapshots of one model, and returns the amount of updated objects"""
+        count = 0
+        last_pk = None
+        while True:
+            # Get the next chunk of objects, ordered by primary key
+            objects = model._base_manager.order_by("pk")
+            if last_pk is not None:
+                objects = objects.filter(pk__gt=last_pk)
+            ids = list(objects.values_list("pk", flat=True)[:chunk_size])
+            if not ids:
+                break
+            last_pk = ids[-1]
+            # Read all their translations with a single query, and save them with another one
+            model.rebuild_translation_snapshots(ids)
+            count += len(ids)
+        return count
@@ -0,0 +1,76 @@
+# coding: utf-8
+"""
+Description:
+    Management command that copies translations from one environment to another, by only moving what changed
+    It works with files, so that both databases never need to be reachable at once (see "sync.py"):
+        - On the target: "manifest" writes the checksum of each chunk of translations
+        - On the source: "export" compares the manifest with its own checksums, and writes the chunks that differ
+        - On the target: "apply" writes those chunks into the database
+Usage:
+    python manage.py sync_translations manifest target_manifest.json [--bucket-size 1000]
+    python manage.py sync_translations export target_manifest.json changes.json
+    python manage.py sync_translations apply changes.json
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+import json
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Third-party
+
+# Local
+from ...sync import apply_changes, build_manifest, export_changes
+
+
+# --------------------------------------------------------------------------------
+# > Command
+# --------------------------------------------------------------------------------
+class Command(BaseCommand):
+    """Copies translations from one environment to another, by only moving what changed"""
+
+    help = "Builds a manifest of checksums, exports the chunks that differ from it, or applies them"
+
+    def add_arguments(self, parser):
+        """Adds one sub-command per step of the sync"""
+        subparsers = parser.add_subparsers(dest="action", required=True)
+        manifest = subparsers.add_parser("manifest", help="Writes the checksums of our translations")
+        manifest.add_argument("output", help="Path of the manifest to write")
+        manifest.add_argument("--bucket-size", type=int, default=1000, help="Amount of object ids per chunk")
+        export = subparsers.add_parser("export", help="Writes the chunks that differ from a manifest")
+        export.add_argument("manifest", help="Path of the manifest of the target")
+        export.add_argument("output", help="Path of the changes to write")
+        apply = subparsers.add_parser("apply", help="Writes exported chunks into our database")
+        apply.add_argument("changes", help="Path of the changes exported by the source")
+
+    def handle(self, *args, **options):
+        """Runs the requested step"""
+        if options["action"] == "manifest":
+            manifest = build_manifest(options["bucket_size"])
+            self.write_json(options["output"], manifest)
+            self.stdout.write("{} chunks written".format(len(manifest["checksums"])))
+        elif options["action"] == "export":
+            changes = export_changes(self.read_json(options["manifest"]))
+            self.write_json(options["output"], changes)
+            rows = sum(len(chunk["rows"]) for chunk in changes["chunks"])
+            self.stdout.write("{} chunks ({} rows) written".format(len(changes["chunks"]), rows))
+        else:
+            counts = apply_changes(self.read_json(options["changes"]))
+            self.stdout.write("{} translations written, {} rows skipped".format(counts["written"], counts["skipped"]))
+
+    @staticmethod
+    def read_json(path):
+        """Returns the content of a JSON file"""
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    @staticmethod
+    def write_json(path, data):
+        """Writes data into a JSON file"""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
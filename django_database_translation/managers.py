@@ -2,8 +2,13 @@
 """
 Description:
     Contains custom managers to help with our models
+QuerySets:
+    TranslatedQuerySet: QuerySet with helpers to read translations, used by TranslatedModel
+    TranslationQuerySet: QuerySet of Translation, with helpers that work wherever the texts are stored
 Managers:
     NoBulkManager: Prevents the use of the bulk_create method
+    TranslatedManager: NoBulkCreateManager that uses the TranslatedQuerySet
+    TranslationManager: Manager of Translation, which joins the deduplicated texts when they are used
 """
 
 
@@ -13,11 +18,220 @@ Managers:
 # Built-in
 
 # Django
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+from django.db.models.functions import Coalesce, NullIf
 
 # Third-party
 
 # Local
+from .conf import get_setting
+from .lazy import TranslationBatch
+
+
+# --------------------------------------------------------------------------------
+# > QuerySets
+# --------------------------------------------------------------------------------
+class TranslatedQuerySet(models.QuerySet):
+    """QuerySet with helpers to read translations, used by TranslatedModel"""
+
+    def __init__(self, *args, **kwargs):
+        """Adds the options of "prefetch_translations" to the queryset"""
+        super().__init__(*args, **kwargs)
+        self._translation_prefetch = None
+
+    def _clone(self):
+        """Keeps the options of "prefetch_translations" in the cloned querysets"""
+        clone = super()._clone()
+        clone._translation_prefetch = self._translation_prefetch
+        return clone
+
+    def _fetch_all(self):
+        """
+        Once the instances are fetched, groups them in a TranslationBatch for their lazy translations
+        Also attaches their translations if "prefetch_translations" was used
+        """
+        already_fetched = self._result_cache is not None
+        super()._fetch_all()
+        if already_fetched:
+            return
+        instances = [obj for obj in self._result_cache if isinstance(obj, self.model)]
+        batch = TranslationBatch(instances)
+        for instance in instances:
+            instance._translation_batch = batch
+        if self._translation_prefetch is not None:
+            from .utils import prefetch_translations
+            prefetch_translations(instances, **self._translation_prefetch)
+
+    def prefetch_translations(self, field_names=None, languages=None):
+        """
+        Description:
+            Attaches the translations of all the fetched instances, in their "prefetched_translations" attribute
+            Only one additional query is run, when the queryset is evaluated
+        Args:
+            field_names (list, optional): Only fetch the translations of those fields. Defaults to None.
+            languages (list, optional): Only fetch the translations in those languages. Defaults to None.
+        Returns:
+            QuerySet: A copy of the queryset, with the prefetch option
+        """
+        clone = self._chain()
+        clone._translation_prefetch = {"field_names": field_names, "languages": languages}
+        return clone
+
+    def translations(self, field_names=None, languages=None):
+        """
+        Description:
+            Returns the Translation instances of all the objects of the queryset, as a single joined query
+            Their Item, Field and Language are fetched within the same query
+        Args:
+            field_names (list, optional): Only returns the translations of those fields. Defaults to None.
+            languages (list, optional): Only returns the translations in those languages. Defaults to None.
+        Returns:
+            QuerySet: A QuerySet of Translation instances
+        """
+        from .models import Translation
+        content_type = ContentType.objects.get_for_model(self.model, for_concrete_model=False)
+        translations = Translation.objects.filter(
+            item__field__content_type=content_type,
+            item__object_id__in=self.values("pk"),
+        )
+        if field_names is not None:
+            translations = translations.filter(item__field__name__in=field_names)
+        if languages is not None:
+            translations = translations.filter(language__in=languages)
+        return translations.select_related("item__field", "language")
+
+    def with_snapshot_translations(self, language, *field_names):
+        """
+        Description:
+            Annotates each row with the texts stored in its "translation_snapshot" column
+            The annotations are named "<field_name>_translation", and are extracted by the database itself
+            Only works for models that inherit from SnapshotTranslatedModel
+        Args:
+            language (Language or str): Language instance or its "django_language_name"
+            *field_names (str): Names of the translated fields to extract
+        Returns:
+            QuerySet: The annotated queryset
+        """
+        language_name = getattr(language, "django_language_name", language)
+        annotations = {}
+        for field_name in field_names:
+            language_snapshot = KeyTransform(language_name, "translation_snapshot")
+            annotations["{}_translation".format(field_name)] = KeyTextTransform(field_name, language_snapshot)
+        return self.annotate(**annotations)
+
+    def annotate_translations(self, language, *field_names, fallback=True):
+        """
+        Description:
+            Annotates each row with the translated texts of the given fields, named "<field_name>_translation"
+            With "fallback", the first non-empty text of the language's fallback chain is used
+            Everything is resolved within the main query, using one subquery per field
+            With settings.DDT_LOOKUP_TABLE, the subqueries read the TranslationLookup table instead
+        Args:
+            language (Language): Language instance from this app
+            *field_names (str): Names of the translated fields to annotate
+            fallback (bool, optional): Whether to use the fallback chain of the language. Defaults to True.
+        Returns:
+            QuerySet: The annotated queryset
+        """
+        from .models import Translation, TranslationLookup
+        use_lookups = get_setting("LOOKUP_TABLE")
+        content_type = ContentType.objects.get_for_model(self.model, for_concrete_model=False)
+        chain = language.get_fallback_chain() if fallback else [language.id]
+        priority = models.Case(
+            *[models.When(language_id=language_id, then=models.Value(i)) for i, language_id in enumerate(chain)],
+            output_field=models.IntegerField(),
+        )
+        annotations = {}
+        for field_name in field_names:
+            if use_lookups:
+                texts = TranslationLookup.objects.filter(
+                    language_id__in=chain,
+                    content_type=content_type,
+                    object_id=models.OuterRef("pk"),
+                    field_name=field_name,
+                )
+                texts = texts.annotate(priority=priority).order_by("priority").values("text")[:1]
+            else:
+                attname = self.model._meta.get_field(field_name).attname
+                texts = Translation.objects.filter(item_id=models.OuterRef(attname), language_id__in=chain)
+                texts = texts.non_empty().with_text("full_text").annotate(priority=priority)
+                texts = texts.order_by("priority").values("full_text")[:1]
+            annotations["{}_translation".format(field_name)] = Coalesce(
+                models.Subquery(texts),
+                models.Value(""),
+                output_field=models.TextField(),
+            )
+        return self.annotate(**annotations)
+
+
+class TranslationQuerySet(models.QuerySet):
+    """
+    QuerySet of Translation, with helpers that work wherever the texts are stored
+    With settings.DDT_DEDUPLICATE_TEXTS, a text is either in the "text" column or in the referenced TranslationText
+    The column alone is then not the full text: filter and read the texts with "with_text" ("full_text"),
+    and use "select_texts" when the instances' "text" attribute is read
+    Its "bulk_create" and "bulk_update" methods store the texts where they belong, with a few bulk queries
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Stores the texts in TranslationText before inserting the rows (see "Translation.deduplicate_texts")"""
+        objs = list(objs)
+        self.model.deduplicate_texts(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """
+        When "text" is updated, also stores the texts where they belong (see "Translation.deduplicate_texts")
+        Since "bulk_update" reads the attributes (ie the full texts), the deduplicated columns are emptied afterwards
+        """
+        fields = list(fields)
+        if "text" not in fields:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        self.model.deduplicate_texts(objs)
+        other_fields = [field for field in fields if field not in ("text", "text_ref")]
+        stored = [obj for obj in objs if obj.text_ref_id is None]
+        deduplicated = [obj for obj in objs if obj.text_ref_id is not None]
+        super().bulk_update(stored, other_fields + ["text", "text_ref"], *args, **kwargs)
+        if deduplicated:
+            super().bulk_update(deduplicated, other_fields + ["text_ref"], *args, **kwargs)
+            self.filter(pk__in=[obj.pk for obj in deduplicated]).exclude(text="").update(text="")
+
+    def empty(self):
+        """Returns the translations without text"""
+        return self.filter(self._get_empty_filter())
+
+    def non_empty(self):
+        """Returns the translations with a text"""
+        return self.exclude(self._get_empty_filter())
+
+    def select_texts(self):
+        """Fetches the deduplicated texts within the same query, so that reading "text" needs no query"""
+        if get_setting("DEDUPLICATE_TEXTS"):
+            return self.select_related("text_ref")
+        return self
+
+    def with_text(self, name="full_text"):
+        """Annotates the full text of each translation (ie for "values_list"), under the given name"""
+        if get_setting("DEDUPLICATE_TEXTS"):
+            text = Coalesce(
+                NullIf("text", models.Value("")),
+                "text_ref__text",
+                models.Value(""),
+                output_field=models.TextField(),
+            )
+        else:
+            text = models.F("text")
+        return self.annotate(**{name: text})
+
+    @staticmethod
+    def _get_empty_filter():
+        """Returns the Q object matching the translations without text"""
+        if get_setting("DEDUPLICATE_TEXTS"):
+            return models.Q(text="", text_ref__isnull=True)
+        return models.Q(text="")
 
 
 # --------------------------------------------------------------------------------
@@ -27,3 +241,16 @@ class NoBulkCreateManager(models.Manager):
     """Prevents the use of the bulk_create method"""
     def bulk_create(self, objs, **kwargs):
         raise NotImplementedError("Cannot use bulk_create on this model")
+
+
+class TranslatedManager(NoBulkCreateManager.from_queryset(TranslatedQuerySet)):
+    """NoBulkCreateManager that uses the TranslatedQuerySet"""
+    pass
+
+
+class TranslationManager(models.Manager.from_queryset(TranslationQuerySet)):
+    """
+    Manager of Translation, using the TranslationQuerySet
+    The deduplicated texts are not joined by default, so that "only" and "defer" keep working (see "select_texts")
+    """
+    pass
@@ -0,0 +1,80 @@
+# coding: utf-8
+"""
+Description:
+    Contains middlewares to use in your "settings.MIDDLEWARE"
+Middlewares:
+    LanguageMiddleware: Resolves the Language of each request, activates it, and attaches it as "request.language"
+    TranslationRouterMiddleware: Extends the read-your-writes guard of the TranslationRouter to the next requests
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.utils import translation
+
+# Third-party
+
+# Local
+from .conf import get_setting
+from .models import Language
+from .routers import has_written, pin_to_primary, unpin
+from .utils import get_request_language
+
+
+# --------------------------------------------------------------------------------
+# > Middlewares
+# --------------------------------------------------------------------------------
+class LanguageMiddleware:
+    """
+    Resolves the Language of each request, and attaches it as "request.language"
+    The language comes from the URL prefix, the session, or the Accept-Language header (with a single query)
+    It is activated in django's translation system (ie for gettext and templates), like django's LocaleMiddleware
+    Our utils functions then use it directly, without reading the session nor querying the database again
+    When no Language matches, "request.language" is None and nothing is activated
+    Must be placed after django's SessionMiddleware
+    """
+
+    def __init__(self, get_response):
+        """Stores the next middleware/view"""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Attaches and activates the language of the request, then restores the previous one"""
+        try:
+            request.language = get_request_language(request)
+        except Language.DoesNotExist:
+            request.language = None
+            return self.get_response(request)
+        with translation.override(request.language.django_language_name):
+            request.LANGUAGE_CODE = translation.get_language()
+            response = self.get_response(request)
+        response.setdefault("Content-Language", request.LANGUAGE_CODE)
+        return response
+
+
+class TranslationRouterMiddleware:
+    """
+    Extends the read-your-writes guard of the TranslationRouter to the next requests of the same client
+    When a request writes translations, a short-lived cookie is set (see settings.DDT_PIN_SECONDS)
+    While the cookie is present, the reads of the client use the primary database (ie after a redirect)
+    """
+
+    cookie_name = "ddt_pinned"
+
+    def __init__(self, get_response):
+        """Stores the next middleware/view"""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Pins the thread if the cookie is present, and sets the cookie if the request wrote something"""
+        unpin()
+        if request.COOKIES.get(self.cookie_name):
+            pin_to_primary()
+        response = self.get_response(request)
+        if has_written():
+            response.set_cookie(self.cookie_name, "1", max_age=get_setting("PIN_SECONDS"), httponly=True)
+        return response
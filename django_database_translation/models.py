@@ -5,17 +5,23 @@ Description:
     - Field --> Item --> Translation <-- Language
     - Field and Language instances must be inserted manually
     - Item and Translation instances are both created and deleted automatically, using "signals.py" and "CASCADE"
+    - In sparse mode (settings.DDT_SPARSE_TRANSLATIONS), only non-empty Translation instances are stored
     A few things to note are:
         - We can traceback a Translation to its application and model (using ContentType)
         - If a model creates other model instances with signals, we block its "bulk_create" method with a custom manager
         - As a reminder, bulk_create does not return PK, so we can only use it on the "last" table of any chain reaction
 Abstract Models:
     TranslatedModel: Abstract model to be used as parent for any model that requires translation
+    SnapshotTranslatedModel: TranslatedModel that also stores all of its translations in a JSON column
 Models:
     Field: Lookup table that contains the list of fields eligible for translation.
     Item: Content table that stores the actual item that must be translated (object + field).
     Language: Lookup table that contains the list of available languages.
     Translation: Content table that stores all the available translations
+    TranslationJob: Queue of the heavy Item/Translation creations, processed by "process_translation_jobs"
+    TranslationLookup: Denormalised copy of the non-empty translations, keyed by language, object and field name
+    TranslationText: Deduplicated texts of the translations, keyed by their hash (see DDT_DEDUPLICATE_TEXTS)
+    TranslationVersion: Version of the translations of each language and content type (see DDT_TRACK_VERSIONS)
 """
 
 
@@ -23,18 +29,21 @@ Models:
 # > Imports
 # --------------------------------------------------------------------------------
 # Built-in
+import hashlib
 
 # Django
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import models, transaction
 
 # Third-party
 
 # Local
-from .fields import ForeignKeyCascade, NotEmptyCharField
-from .managers import NoBulkCreateManager
+from .conf import get_setting
+from .fields import DeduplicatedTextField, ForeignKeyCascade, NotEmptyCharField
+from .lazy import TranslatedValuesDescriptor
+from .managers import NoBulkCreateManager, TranslatedManager, TranslationManager
 
 
 # --------------------------------------------------------------------------------
@@ -47,6 +56,7 @@ class TranslatedModel(models.Model):
         - A manager that prevents the "objects.bulk_create" method
         - A basic "__str__" method
         - methods to easily get translation info from the instance
+        - A "translated" descriptor that returns lazy translations (ie "product.translated.name")
     """
     # ----------------------------------------
     # Constants
@@ -67,7 +77,12 @@ class TranslatedModel(models.Model):
     # ----------------------------------------
     # Custom Managers
     # ----------------------------------------
-    objects = NoBulkCreateManager()
+    objects = TranslatedManager()
+
+    # ----------------------------------------
+    # Descriptors
+    # ----------------------------------------
+    translated = TranslatedValuesDescriptor()
 
     # ----------------------------------------
     # META, str, save, get_absolute_url
@@ -84,11 +99,8 @@ class TranslatedModel(models.Model):
     # Custom Methods
     # ----------------------------------------
     def get_content_type_instance(self):
-        """Returns the ContentType instance of our object"""
-        app = self._meta.app_label.lower()
-        model = self.__class__.__name__.lower()
-        content_type = ContentType.objects.get(app_label=app, model=model)
-        return content_type
+        """Returns the ContentType instance of our object (cached by Django after the first call)"""
+        return ContentType.objects.get_for_model(self, for_concrete_model=False)
 
     def get_translated_fields(self):
         """Returns a QuerySet of all the Field instances associated with the Model of our instance"""
@@ -98,17 +110,130 @@ class TranslatedModel(models.Model):
 
     def get_translated_items(self):
         """Returns a QuerySet of all the Item instances associated with our instance"""
-        fields = self.get_translated_fields()
-        items = Item.objects.filter(object_id=self.id, field__in=fields)
+        content_type = self.get_content_type_instance()
+        items = Item.objects.filter(object_id=self.id, field__content_type=content_type)
         return items
 
     def get_translations(self):
-        """Returns a QuerySet of all the Translation instances associated with our instance"""
-        items = self.get_translated_items()
-        translations = Translation.objects.filter(item__in=items)
+        """
+        Returns a QuerySet of all the Translation instances associated with our instance
+        It always queries the database: the list attached by "prefetch_translations" is not read here,
+        so use the "prefetched_translations" attribute directly to avoid the query
+        """
+        content_type = self.get_content_type_instance()
+        translations = Translation.objects.filter(item__object_id=self.id, item__field__content_type=content_type)
+        return translations.select_texts()
+
+    def get_or_build_translations(self):
+        """
+        Returns a list with one Translation instance per Item and Language of our instance
+        Existing rows are fetched, and missing ones (such as in sparse mode) are built without being saved
+        """
+        items = self.get_translated_items().select_related("field").order_by("field__name")
+        languages = list(Language.objects.all())
+        existing = {
+            (translation.item_id, translation.language_id): translation
+            for translation in Translation.objects.filter(item__in=items).select_texts()
+        }
+        translations = []
+        for item in items:
+            for language in languages:
+                translation = existing.get((item.id, language.id))
+                if translation is None:
+                    translation = Translation(item=item, language=language)
+                translation.item = item
+                translation.language = language
+                translations.append(translation)
         return translations
 
 
+class SnapshotTranslatedModel(TranslatedModel):
+    """
+    TranslatedModel that also stores all of its translations in a JSON column, as {language: {field: text}}
+    The languages are identified by their "django_language_name"
+    The snapshot is updated whenever a Translation is saved, and can be rebuilt with "rebuild_translation_snapshots"
+    Reading the translations of one instance then requires no additional query
+    Since the snapshot is maintained by our signals, "save" leaves it out of the UPDATE (unless in "update_fields")
+    """
+
+    # ----------------------------------------
+    # Fields
+    # ----------------------------------------
+    translation_snapshot = models.JSONField(
+        blank=True,
+        default=dict,
+        editable=False,
+        help_text="Copy of all the translations of the instance, maintained automatically",
+        verbose_name="Translation snapshot",
+    )
+
+    # ----------------------------------------
+    # META, str, save, get_absolute_url
+    # ----------------------------------------
+    class Meta:
+        """Metadata to configure our model in the database"""
+        abstract = True
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """Saves the instance without its snapshot, which may be older than the one refreshed by our signals"""
+        if update_fields is None and not force_insert and not self._state.adding:
+            excluded = self.get_deferred_fields() | {"translation_snapshot"}
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in excluded
+            ]
+        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
+    # ----------------------------------------
+    # Custom Methods
+    # ----------------------------------------
+    def build_translation_snapshot(self):
+        """Returns the snapshot of our instance, computed from the Translation table"""
+        snapshot = {}
+        rows = self.get_translations().with_text().values_list(
+            "language__django_language_name", "item__field__name", "full_text"
+        )
+        for language_name, field_name, text in rows:
+            snapshot.setdefault(language_name, {})[field_name] = text
+        return snapshot
+
+    def get_snapshot_translation(self, field_name, language):
+        """Returns the text of a field from the snapshot, using a Language instance or its django name"""
+        return self.get_snapshot_translations(language).get(field_name, "")
+
+    def get_snapshot_translations(self, language):
+        """Returns the {field: text} dict of a language from the snapshot"""
+        language_name = getattr(language, "django_language_name", language)
+        return self.translation_snapshot.get(language_name, {})
+
+    @classmethod
+    def rebuild_translation_snapshots(cls, object_ids):
+        """Rebuilds the snapshots of some objects from the Translation table, with one query to read and one to save"""
+        content_type = ContentType.objects.get_for_model(cls)
+        snapshots = {object_id: {} for object_id in object_ids}
+        rows = Translation.objects.filter(
+            item__content_type=content_type,
+            item__object_id__in=snapshots.keys(),
+        ).with_text().values_list(
+            "item__object_id", "language__django_language_name", "item__field__name", "full_text"
+        )
+        for object_id, language_name, field_name, text in rows:
+            snapshots[object_id].setdefault(language_name, {})[field_name] = text
+        objects = [cls(pk=object_id, translation_snapshot=snapshot) for object_id, snapshot in snapshots.items()]
+        cls._base_manager.bulk_update(objects, ["translation_snapshot"])
+
+    @classmethod
+    def update_translation_snapshot(cls, object_id, language_name, field_name, text):
+        """Updates one text within the snapshot of an object, without triggering any signal"""
+        with transaction.atomic():
+            queryset = cls._base_manager.select_for_update().filter(pk=object_id)
+            snapshot = queryset.values_list("translation_snapshot", flat=True).first()
+            if snapshot is None:
+                snapshot = {}
+            snapshot.setdefault(language_name, {})[field_name] = text
+            queryset.update(translation_snapshot=snapshot)
+
+
 # --------------------------------------------------------------------------------
 # > Models
 # --------------------------------------------------------------------------------
@@ -168,8 +293,9 @@ class Field(models.Model):
     count_items.short_description = "Items"
 
     def count_missing_translations(self):
-        """Returns the amount of empty Translation instances attached to this field"""
-        return Translation.objects.filter(item__field=self).filter(text="").count()
+        """Returns the amount of Item/Language pairs of this field without text (empty or missing rows)"""
+        expected = Item.objects.filter(field=self).count() * Language.objects.count()
+        return expected - Translation.objects.filter(item__field=self).non_empty().count()
     count_missing_translations.short_description = "Missing Translations"
 
     def get_app_name(self):
@@ -230,8 +356,8 @@ class Item(models.Model):
     # Custom Properties
     # ----------------------------------------
     def count_missing_translations(self):
-        """Returns the amount of empty Translation instances attached to this item"""
-        return Translation.objects.filter(item=self).filter(text="").count()
+        """Returns the amount of languages without text for this item (empty or missing rows)"""
+        return Language.objects.count() - Translation.objects.filter(item=self).non_empty().count()
     count_missing_translations.short_description = "Missing Translations"
 
 
@@ -240,6 +366,7 @@ class Language(models.Model):
     Lookup table that contains the list of available languages.
     Used for translating the database and the frontend.
     Language sends a signal on create that generates "Translation" instances.
+    Those translations are copied from the "cloned_from" language if it is set, instead of being empty.
     """
 
     # ----------------------------------------
@@ -268,6 +395,24 @@ class Language(models.Model):
         unique=True,
         verbose_name="Django language name"
     )
+    fallback = models.ForeignKey(
+        "self",
+        blank=True,
+        help_text="Language to use when a text is missing in this language (can itself have a fallback)",
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="fallback_of",
+        verbose_name="Fallback language"
+    )
+    cloned_from = models.ForeignKey(
+        "self",
+        blank=True,
+        help_text="On creation, copies all the texts of this language instead of creating empty translations",
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="clones",
+        verbose_name="Cloned from"
+    )
 
     # ----------------------------------------
     # Custom Managers
@@ -291,24 +436,45 @@ class Language(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        """Overrides the save method to 'upper' ISO2 and ISO3"""
+        """Overrides the save method to 'upper' ISO2 and ISO3, and to reset the cached fallback chain"""
         self.iso2 = self.iso2.upper()
         self.iso3 = self.iso3.upper()
+        self._fallback_chain = None
         super().save(*args, **kwargs)
 
     # ----------------------------------------
     # Custom Methods
     # ----------------------------------------
     def count_missing_translations(self):
-        """Returns the amount of empty Translation instances attached to this language"""
-        return Translation.objects.filter(language=self).filter(text="").count()
+        """Returns the amount of items without text in this language (empty or missing rows)"""
+        return Item.objects.count() - Translation.objects.filter(language=self).non_empty().count()
     count_missing_translations.short_description = "Missing Translations"
 
+    def get_fallback_chain(self):
+        """
+        Returns the list of Language ids to try, in order, starting with this language
+        The chain follows the "fallback" keys, using a single query, and stops if a language appears twice
+        The result is cached on the instance, so that batches of lookups do not query it again
+        """
+        if getattr(self, "_fallback_chain", None) is None:
+            fallbacks = dict(Language.objects.values_list("id", "fallback_id"))
+            chain = []
+            language_id = self.id
+            while language_id is not None and language_id not in chain:
+                chain.append(language_id)
+                language_id = fallbacks.get(language_id)
+            self._fallback_chain = chain
+        return self._fallback_chain
+
 
 class Translation(models.Model):
     """
     Content table that stores all the available translations.
     Each entry contains a language and an item (both ForeignKey).
+    With settings.DDT_DEDUPLICATE_TEXTS, non-empty texts are stored once in TranslationText, and referenced.
+    The "text" attribute still returns the full text, and "Translation.objects" has helpers for the queries.
+    Queries on the "text" column (ie "filter(text=...)" or "values_list('text')") only see the texts that were
+    not deduplicated: use "with_text" and its "full_text" annotation instead.
     """
 
     # ----------------------------------------
@@ -322,11 +488,25 @@ class Translation(models.Model):
         "Item",
         verbose_name="Item"
     )
-    text = models.TextField(
+    text = DeduplicatedTextField(
         default="",
         null=False,
+        ref_field="text_ref",
         verbose_name="Translated text"
     )
+    text_ref = models.ForeignKey(
+        "TranslationText",
+        blank=True,
+        editable=False,
+        null=True,
+        on_delete=models.PROTECT,
+        verbose_name="Deduplicated text"
+    )
+
+    # ----------------------------------------
+    # Custom Managers
+    # ----------------------------------------
+    objects = TranslationManager()
 
     # ----------------------------------------
     # META, str, save, get_absolute_url
@@ -350,6 +530,46 @@ class Translation(models.Model):
         """Returns a string with the 'item' and the 'language'"""
         return "{} ({})".format(self.item, self.language)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Flags the instances whose text must be read from TranslationText (see DeduplicatedTextDescriptor)"""
+        instance = super().from_db(db, field_names, values)
+        if instance.__dict__.get("text") == "" and instance.__dict__.get("text_ref_id") is not None:
+            instance.__dict__["_deduplicated_text"] = True
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Also saves the reference to the deduplicated text, whenever the text is saved"""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "text" in update_fields and "text_ref" not in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["text_ref"]
+        super().save(*args, **kwargs)
+
+    # ----------------------------------------
+    # Custom Methods
+    # ----------------------------------------
+    @staticmethod
+    def deduplicate_texts(translations):
+        """
+        Prepares Translation instances for 'bulk_create' or 'bulk_update' (called by TranslationQuerySet)
+        With settings.DDT_DEDUPLICATE_TEXTS, their texts are stored in TranslationText with a few bulk queries
+        Otherwise, their texts are kept in the column and their references are removed
+        """
+        if not get_setting("DEDUPLICATE_TEXTS"):
+            for translation in translations:
+                # Read the text before removing its reference
+                translation.text = translation.text
+                translation.text_ref = None
+            return
+        texts = TranslationText.get_instances([translation.text for translation in translations if translation.text])
+        for translation in translations:
+            if translation.text:
+                translation.text_ref = texts[translation.text]
+                translation.__dict__["text"] = ""
+                translation.__dict__["_deduplicated_text"] = True
+            else:
+                translation.text_ref = None
+
     # ----------------------------------------
     # Custom Properties
     # ----------------------------------------
@@ -360,3 +580,325 @@ class Translation(models.Model):
         except IndexError:
             return self.text
     truncated_text.short_description = "Translated Text"
+
+
+class TranslationLookup(models.Model):
+    """
+    Denormalised copy of the non-empty translations, used with settings.DDT_LOOKUP_TABLE.
+    Each row is keyed exactly like our reads: language, content type, object id, and field name.
+    The language leads the unique index, so each language is read from its own contiguous part of the index.
+    Rows are refreshed by signals when translations are saved, and can be rebuilt with "rebuild_translation_lookups".
+    """
+
+    # ----------------------------------------
+    # Fields
+    # ----------------------------------------
+    language = ForeignKeyCascade(
+        "Language",
+        verbose_name="Language"
+    )
+    content_type = ForeignKeyCascade(
+        ContentType,
+        verbose_name="Content Type"
+    )
+    object_id = models.PositiveIntegerField(
+        null=False,
+        verbose_name="Object ID"
+    )
+    field_name = NotEmptyCharField(
+        max_length=100,
+        verbose_name="Field name"
+    )
+    item = ForeignKeyCascade(
+        "Item",
+        verbose_name="Item"
+    )
+    text = models.TextField(
+        default="",
+        null=False,
+        verbose_name="Translated text"
+    )
+
+    # ----------------------------------------
+    # META, str, save, get_absolute_url
+    # ----------------------------------------
+    class Meta:
+        """Metadata to configure our model in the database"""
+        db_table = "ddt_lookups"
+        indexes = []
+        ordering = []
+        unique_together = [
+            ["language", "content_type", "object_id", "field_name"],
+        ]
+        verbose_name = "Translation lookup"
+        verbose_name_plural = "Translation lookups"
+
+    def __str__(self):
+        """Returns the object, field and language of the row"""
+        return "{}.{}.{} ({})".format(self.content_type, self.field_name, self.object_id, self.language_id)
+
+
+class TranslationJob(models.Model):
+    """
+    Queue of the heavy Item/Translation creations, processed by the "process_translation_jobs" command.
+    With settings.DDT_ASYNC_FANOUT, new Field and Language instances create a job instead of doing the work.
+    Jobs are processed in chunks of primary keys, and the "cursor" is saved with each chunk.
+    A job that crashed can therefore resume from its last committed chunk.
+    The backfill of a Field can be split into several "field_range" jobs, processed in parallel.
+    With settings.DDT_BUNDLE_ON_WRITE, "bundle" jobs rebuild the JSON bundle of an application and a Language.
+    """
+
+    # ----------------------------------------
+    # Constants
+    # ----------------------------------------
+    KIND_FIELD = "field"
+    KIND_FIELD_RANGE = "field_range"
+    KIND_BUNDLE = "bundle"
+    KIND_LANGUAGE = "language"
+    KIND_CHOICES = [
+        (KIND_FIELD, "Create the Items of a Field"),
+        (KIND_FIELD_RANGE, "Create the Items of a Field, for a range of objects"),
+        (KIND_LANGUAGE, "Create the Translations of a Language"),
+        (KIND_BUNDLE, "Rebuild the JSON bundle of an application, in a Language"),
+    ]
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    # ----------------------------------------
+    # Fields
+    # ----------------------------------------
+    kind = NotEmptyCharField(
+        choices=KIND_CHOICES,
+        max_length=20,
+        verbose_name="Kind"
+    )
+    field = models.ForeignKey(
+        "Field",
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        verbose_name="Field"
+    )
+    language = models.ForeignKey(
+        "Language",
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        verbose_name="Language"
+    )
+    app_label = models.CharField(
+        blank=True,
+        default="",
+        help_text="Application of the bundle (for 'bundle' jobs)",
+        max_length=100,
+        verbose_name="Application"
+    )
+    status = NotEmptyCharField(
+        choices=STATUS_CHOICES,
+        db_index=True,
+        default=STATUS_PENDING,
+        max_length=20,
+        verbose_name="Status"
+    )
+    start_pk = models.BigIntegerField(
+        blank=True,
+        help_text="First primary key of the range (for 'field_range' jobs)",
+        null=True,
+        verbose_name="Start PK"
+    )
+    end_pk = models.BigIntegerField(
+        blank=True,
+        help_text="Last primary key of the range (for 'field_range' jobs)",
+        null=True,
+        verbose_name="End PK"
+    )
+    cursor = models.BigIntegerField(
+        blank=True,
+        help_text="Primary key of the last processed row",
+        null=True,
+        verbose_name="Cursor"
+    )
+    processed = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Processed rows"
+    )
+    total = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Total rows"
+    )
+    error = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="Error"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Created at"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Updated at"
+    )
+
+    # ----------------------------------------
+    # META, str, save, get_absolute_url
+    # ----------------------------------------
+    class Meta:
+        """Metadata to configure our model in the database"""
+        db_table = "ddt_jobs"
+        indexes = []
+        ordering = ["-id"]
+        unique_together = []
+        verbose_name = "Translation job"
+        verbose_name_plural = "Translation jobs"
+
+    def __str__(self):
+        """Returns the kind and the target of the job"""
+        if self.kind == self.KIND_FIELD_RANGE:
+            return "{} ({}, {}-{})".format(self.get_kind_display(), self.field, self.start_pk, self.end_pk)
+        if self.kind == self.KIND_BUNDLE:
+            return "{} ({}, {})".format(self.get_kind_display(), self.app_label, self.language)
+        target = self.field if self.kind == self.KIND_FIELD else self.language
+        return "{} ({})".format(self.get_kind_display(), target)
+
+    # ----------------------------------------
+    # Custom Properties
+    # ----------------------------------------
+    def progress(self):
+        """Returns the progress of the job as a percentage string"""
+        if self.status == self.STATUS_DONE:
+            return "100%"
+        if not self.total:
+            return "0%"
+        return "{}%".format(min(100, self.processed * 100 // self.total))
+    progress.short_description = "Progress"
+
+
+class TranslationText(models.Model):
+    """
+    Deduplicated texts of the translations, used with settings.DDT_DEDUPLICATE_TEXTS.
+    Each distinct text is stored once, and found through the sha256 hash of its content.
+    Rows are never updated nor deleted when a translation changes: a new text creates (or reuses) another row,
+    and unused rows are only removed by the "deduplicate_translation_texts" command (ie with "--prune-only").
+    """
+
+    # ----------------------------------------
+    # Fields
+    # ----------------------------------------
+    hash = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="SHA-256 hash"
+    )
+    text = models.TextField(
+        verbose_name="Text"
+    )
+
+    # ----------------------------------------
+    # META, str, save, get_absolute_url
+    # ----------------------------------------
+    class Meta:
+        """Metadata to configure our model in the database"""
+        db_table = "ddt_texts"
+        indexes = []
+        ordering = []
+        unique_together = []
+        verbose_name = "Translation text"
+        verbose_name_plural = "Translation texts"
+
+    def __str__(self):
+        """Returns the first 20 characters of the text"""
+        return self.text[:20]
+
+    # ----------------------------------------
+    # Custom Methods
+    # ----------------------------------------
+    @staticmethod
+    def get_hash(text):
+        """Returns the sha256 hash of a text, as an hexadecimal string"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def get_ids(cls, texts):
+        """Returns the ids of the rows of the given texts, as {text: id}, creating the missing ones"""
+        return {text: instance.pk for text, instance in cls.get_instances(texts).items()}
+
+    @classmethod
+    def get_instances(cls, texts):
+        """Returns the rows of the given texts, as {text: instance}, creating the missing ones with 'bulk_create'"""
+        hashes = {cls.get_hash(text): text for text in set(texts)}
+        instances = {instance.hash: instance for instance in cls.objects.filter(hash__in=list(hashes))}
+        missing = [cls(hash=value, text=text) for value, text in hashes.items() if value not in instances]
+        if missing:
+            # Another process may have inserted the same texts in the meantime
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            instances.update({
+                instance.hash: instance
+                for instance in cls.objects.filter(hash__in=[instance.hash for instance in missing])
+            })
+        return {text: instances[value] for value, text in hashes.items()}
+
+
+class TranslationVersion(models.Model):
+    """
+    Versions of the translations, used with settings.DDT_TRACK_VERSIONS.
+    Each language has a global row (without content type) and one row per content type, whose version is
+    incremented every time one of their translations or items is written (see "versions.py").
+    They are used to answer conditional requests (ETag/Last-Modified) without reading the translations.
+    Since NULL values are distinct in "unique_together", a partial constraint keeps one global row per language.
+    """
+
+    # ----------------------------------------
+    # Fields
+    # ----------------------------------------
+    language = ForeignKeyCascade(
+        "Language",
+        verbose_name="Language"
+    )
+    content_type = models.ForeignKey(
+        ContentType,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        verbose_name="Content Type"
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Version"
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="Updated at"
+    )
+
+    # ----------------------------------------
+    # META, str, save, get_absolute_url
+    # ----------------------------------------
+    class Meta:
+        """Metadata to configure our model in the database"""
+        constraints = [
+            models.UniqueConstraint(
+                condition=models.Q(content_type__isnull=True),
+                fields=["language"],
+                name="ddt_versions_unique_global",
+            ),
+        ]
+        db_table = "ddt_versions"
+        indexes = []
+        ordering = []
+        unique_together = [
+            ["language", "content_type"],
+        ]
+        verbose_name = "Translation version"
+        verbose_name_plural = "Translation versions"
+
+    def __str__(self):
+        """Returns the language, content type and version of the row"""
+        return "{} {} (v{})".format(self.language_id, self.content_type or "*", self.version)
@@ -0,0 +1,126 @@
+# coding: utf-8
+"""
+Description:
+    Contains a database router that sends the reads of our models to replicas, and their writes to the primary
+    To use it, add "django_database_translation.routers.TranslationRouter" to your "settings.DATABASE_ROUTERS"
+    Then list your replicas in "settings.DDT_READ_DATABASES" (and your primary in "settings.DDT_WRITE_DATABASE")
+    Read-your-writes guard:
+        - As soon as one of our models is written, the current thread is "pinned" to the primary
+        - The pin is removed at the start of the next request, and at the end of each TranslationJob (see "jobs.py")
+        - Long-running commands can call "unpin" themselves, or use "read_scope" around each unit of work
+        - With the TranslationRouterMiddleware, the pin also lasts a few seconds for the same client (ie redirects)
+Classes:
+    TranslationRouter: Database router for the models of this app
+Functions:
+    has_written: Checks if the current thread wrote in one of our models since it was last unpinned
+    is_pinned: Checks if the reads of the current thread must use the primary database
+    pin_to_primary: Sends the following reads of the current thread to the primary database
+    unpin: Allows the reads of the current thread to use the replicas again
+Context Managers:
+    read_scope: Unpins the current thread when entering and leaving the block (ie around one job of a worker)
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+from contextlib import contextmanager
+import random
+import threading
+
+# Django
+from django.core.signals import request_started
+from django.dispatch import receiver
+
+# Third-party
+
+# Local
+from .conf import get_setting
+
+
+# --------------------------------------------------------------------------------
+# > Classes
+# --------------------------------------------------------------------------------
+class TranslationRouter:
+    """
+    Database router for the models of this app
+    Reads go to a random replica (unless the thread is pinned), writes go to the primary and pin the thread
+    Models from other applications are left to the other routers
+    """
+
+    app_label = "django_database_translation"
+
+    def db_for_read(self, model, **hints):
+        """Returns a random replica, or the primary if the thread is pinned or if there are no replicas"""
+        if model._meta.app_label != self.app_label:
+            return None
+        replicas = get_setting("READ_DATABASES")
+        if is_pinned() or not replicas:
+            return get_setting("WRITE_DATABASE")
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        """Returns the primary, and pins the thread so that the next reads see this write"""
+        if model._meta.app_label != self.app_label:
+            return None
+        pin_to_primary()
+        _local.written = True
+        return get_setting("WRITE_DATABASE")
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Replicas hold the same data as the primary, so relations with our models are always allowed"""
+        if self.app_label in {obj1._meta.app_label, obj2._meta.app_label}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Our tables are migrated on the primary and on the replicas (ie when they are separate databases)"""
+        if app_label != self.app_label:
+            return None
+        return db == get_setting("WRITE_DATABASE") or db in get_setting("READ_DATABASES")
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+_local = threading.local()
+
+
+def has_written():
+    """Checks if the current thread wrote in one of our models since it was last unpinned"""
+    return getattr(_local, "written", False)
+
+
+def is_pinned():
+    """Checks if the reads of the current thread must use the primary database"""
+    return getattr(_local, "pinned", False)
+
+
+def pin_to_primary():
+    """Sends the following reads of the current thread to the primary database"""
+    _local.pinned = True
+
+
+@receiver(request_started)
+def unpin(sender=None, **kwargs):
+    """Allows the reads of the current thread to use the replicas again"""
+    _local.pinned = False
+    _local.written = False
+
+
+# --------------------------------------------------------------------------------
+# > Context Managers
+# --------------------------------------------------------------------------------
+@contextmanager
+def read_scope():
+    """
+    Unpins the current thread when entering and leaving the block
+    Within the block, reads still go to the primary after a write, but the pin does not leak into the next block
+    This is what a request does for views, for the loops of workers and commands
+    """
+    unpin()
+    try:
+        yield
+    finally:
+        unpin()
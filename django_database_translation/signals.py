@@ -4,13 +4,36 @@ Description:
     Internal signal callbacks allow:
     --> Field to create Item
     --> Item to create Translation
-    --> Language to create Translation
+    --> Language to create Translation (or to copy the ones of the Language it is cloned from)
     External signal callbacks allow any declared table to create or delete related "Item" instance
     And those "Item" instances then create "Translation" instances using or internal signal callbacks
+    In sparse mode (settings.DDT_SPARSE_TRANSLATIONS), empty "Translation" instances are never created
+    With settings.DDT_ASYNC_FANOUT, Field and Language only create a TranslationJob, processed by a worker command
+    With settings.DDT_LOOKUP_TABLE, saved and deleted translations are copied into the TranslationLookup table
+    With settings.DDT_BUNDLE_ON_WRITE, saved translations create jobs that rebuild their JSON bundles (see "bundles.py")
+    With settings.DDT_TRACK_VERSIONS, written translations and items increment their versions (see "versions.py")
+    Within "deferred_translation_signals", the per-row callbacks only record their instances,
+    and everything is reconciled with a few set-based queries when leaving the block
+Context Managers:
+    deferred_translation_signals: Defers our per-row callbacks, and reconciles their work in bulk on exit
+Custom Signals:
+    translations_bulk_saved: Sent with a list of Translation instances saved with "bulk_create" or "bulk_update"
 Signal Internal Callbacks:
     create_items_from_field: Creates a new Item instance for this field, for every existing object of the model's field
     create_translations_from_item: Creates Translation instances with our item for each available language
     create_translations_from_language: Creates new Translation entry for every unique "item" in Translation
+    invalidate_lazy_translations: Makes the lazy translations of the process fetch their texts again
+    delete_translation_snapshot: Empties the deleted text in the snapshot of its object, if its model uses one
+    update_translation_snapshot: Copies the saved text into the snapshot of its object, if its model uses one
+    update_translation_snapshots: Same as 'update_translation_snapshot', for translations saved in bulk
+    delete_translation_lookup: Deletes the lookup row of the deleted translation
+    update_translation_lookup: Copies the saved translation into the TranslationLookup table
+    update_translation_lookups: Same as 'update_translation_lookup', for translations saved in bulk
+    update_translation_bundle: Creates the job that rebuilds the JSON bundle of the saved translation
+    update_translation_bundles: Same as 'update_translation_bundle', for translations saved in bulk
+    update_item_versions: Increments the versions of the content type of the created or deleted Item
+    update_translation_versions: Increments the versions of the language and content type of the written translation
+    update_translations_versions: Same as 'update_translation_versions', for translations saved in bulk
 Signal External Callbacks:
     create_translated_items: Creates Item instances everytime an object is created in a translated table
     delete_translated_items: Deletes Item instances everytime an object is deleted in a translated table
@@ -24,16 +47,145 @@ Applying the External Callbacks:
 # > Imports
 # --------------------------------------------------------------------------------
 # Built-in
+from contextlib import contextmanager
+from functools import lru_cache
+import threading
 
 # Django
 from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.transaction import TransactionManagementError
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
 
 # Third-party
 
 # Local
-from .models import Field, Item, Language, Translation
+from .bundles import schedule_bundles
+from .bulk import clone_language, create_items, create_translations_for_items, create_translations_for_language
+from .conf import get_setting
+from .jobs import enqueue_field_jobs, enqueue_job
+from .lazy import invalidate_loaders
+from .lookups import delete_translation_lookups, refresh_translation_lookups
+from .models import Field, Item, Language, SnapshotTranslatedModel, Translation, TranslationJob
+from .versions import bump_versions_on_commit
+
+
+# --------------------------------------------------------------------------------
+# > Custom Signals
+# --------------------------------------------------------------------------------
+# Sent with a "translations" list, since "bulk_create" and "bulk_update" do not send "post_save"
+translations_bulk_saved = Signal()
+
+
+# --------------------------------------------------------------------------------
+# > Context Managers
+# --------------------------------------------------------------------------------
+# Each thread has its own deferral state, so parallel workers do not share their records
+_deferred = threading.local()
+# Amount of rows handled per query when a callback goes through a whole table
+_CHUNK_SIZE = 1000
+
+
+@contextmanager
+def deferred_translation_signals(chunk_size=_CHUNK_SIZE):
+    """
+    Description:
+        Defers our per-row callbacks: within the block, they only record the created or deleted instances
+        When leaving the outermost block, everything recorded is reconciled with set-based queries:
+            - the Items of the deleted objects are deleted
+            - the new Fields get their Items for every existing object
+            - the new objects get their Items for every Field of their model
+            - the new Items get their translations
+            - the new Languages get their translations for every existing Item (or copy the ones they are cloned from)
+        Blocks can be nested, and nothing is reconciled if the block raises an exception
+        The outermost block must therefore run inside "transaction.atomic()" (on settings.DDT_WRITE_DATABASE),
+        so that the rows written within a failed block are rolled back instead of being left without Items
+    Args:
+        chunk_size (int, optional): Amount of rows handled per query. Defaults to 1000.
+    """
+    depth = getattr(_deferred, "depth", 0)
+    if depth == 0:
+        if not transaction.get_connection(get_setting("WRITE_DATABASE")).in_atomic_block:
+            raise TransactionManagementError("deferred_translation_signals must be used inside transaction.atomic()")
+        _deferred.objects = {}
+        _deferred.fields = {}
+        _deferred.items = set()
+        _deferred.languages = {}
+        _deferred.deleted_items = set()
+    _deferred.depth = depth + 1
+    try:
+        yield
+    except BaseException:
+        _deferred.depth -= 1
+        raise
+    _deferred.depth -= 1
+    if _deferred.depth == 0:
+        _reconcile_deferred_signals(chunk_size)
+
+
+def _is_deferred():
+    """Returns whether our callbacks are currently deferred in this thread"""
+    return getattr(_deferred, "depth", 0) > 0
+
+
+def _iter_ids(queryset, chunk_size):
+    """Yields the primary keys of a QuerySet in chunks, using the last key as a cursor"""
+    queryset = queryset.order_by("pk")
+    cursor = None
+    while True:
+        chunk = queryset if cursor is None else queryset.filter(pk__gt=cursor)
+        ids = list(chunk.values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        cursor = ids[-1]
+
+
+def _reconcile_deferred_signals(chunk_size):
+    """Does the work of the callbacks that were deferred, with set-based queries"""
+    objects, fields, items = _deferred.objects, _deferred.fields, _deferred.items
+    languages, deleted_items = _deferred.languages, _deferred.deleted_items
+    _deferred.objects, _deferred.fields, _deferred.items = {}, {}, set()
+    _deferred.languages, _deferred.deleted_items = {}, set()
+    async_fanout = get_setting("ASYNC_FANOUT")
+    sparse = get_setting("SPARSE_TRANSLATIONS")
+    # Deleted objects (their Translations are deleted by CASCADE)
+    deleted_items = list(deleted_items)
+    for i in range(0, len(deleted_items), chunk_size):
+        Item.objects.filter(pk__in=deleted_items[i:i + chunk_size]).delete()
+    # New Fields, for every existing object of their model
+    for field in fields.values():
+        if async_fanout:
+            enqueue_field_jobs(field)
+            continue
+        for ids in _iter_ids(field.content_type.model_class()._base_manager.all(), chunk_size):
+            create_items(field, ids)
+    # New objects, for every Field of their model that was not handled above
+    for model, pks in objects.items():
+        content_type = ContentType.objects.get_for_model(model, for_concrete_model=False)
+        model_fields = Field.objects.filter(content_type=content_type)
+        if len(model_fields) == 0:
+            raise RuntimeError("{} has no entry in the Field table".format(model))
+        queryset = model._base_manager.filter(pk__in=pks)
+        for field in model_fields:
+            if field.pk not in fields:
+                for ids in _iter_ids(queryset, chunk_size):
+                    create_items(field, ids)
+    # New Items, in every Language
+    items = list(items)
+    for i in range(0, len(items), chunk_size):
+        create_translations_for_items(items[i:i + chunk_size])
+    # New Languages, for every existing Item
+    for language in languages.values():
+        if async_fanout:
+            enqueue_job(TranslationJob.KIND_LANGUAGE, language=language)
+        elif language.cloned_from_id is not None:
+            clone_language(language, chunk_size)
+        elif not sparse:
+            for ids in _iter_ids(Item.objects.all(), chunk_size):
+                create_translations_for_language(language, ids)
 
 
 # --------------------------------------------------------------------------------
@@ -45,41 +197,173 @@ def create_items_from_field(sender, instance, created, **kwargs):
     Creates a new Item instance for this field, for every existing object of the model's field
     Technically, this callback does several things:
     - It gets all the existing objects from the model where our Field supposedly comes from
-    - For each object, it creates the associated Item (Field + Object)
-    - Then it adds the new Item PK as a FK back into the object instance
-    Since "bulk_create" cannot be used on Item, so we loop to create them individually
+    - For each chunk of objects, it creates the associated Items (Field + Object)
+    - Then it adds the new Item PKs as FKs back into the objects, with a single UPDATE
+    Items that already exist are ignored (see "create_items"), so concurrent creations cannot conflict
+    With settings.DDT_ASYNC_FANOUT, TranslationJobs are created instead (see "enqueue_field_jobs")
     """
-    if created:
+    if not created:
+        return
+    if _is_deferred():
+        _deferred.fields[instance.pk] = instance
+    elif get_setting("ASYNC_FANOUT"):
+        enqueue_field_jobs(instance)
+    else:
         # Get the class model associated with the new Field
-        app_name = instance.content_type.app_label
-        model_name = instance.content_type.model
-        target_model = apps.get_model(app_name, model_name)
-        # For each object, creates a new item and adds the FK back into the object instance
-        objects = target_model.objects.all()
-        for obj in objects:
-            item = Item.objects.create(field=instance, object_id=obj.pk, content_type=instance.content_type)
-            setattr(obj, instance.name, item)
-            obj.save()
+        target_model = instance.content_type.model_class()
+        for ids in _iter_ids(target_model._base_manager.all(), _CHUNK_SIZE):
+            create_items(instance, ids)
 
 
 @receiver(post_save, sender=Item)
 def create_translations_from_item(sender, instance, created, **kwargs):
-    """Creates Translation instances in every Language for our new Item"""
-    if created:
-        languages = Language.objects.all()
-        if len(languages) > 0:
-            translations = [Translation(item=instance, language=language) for language in languages]
-            Translation.objects.bulk_create(translations)
+    """
+    Creates Translation instances in every Language for our new Item (unless we are in sparse mode)
+    Translations that already exist are ignored, so concurrent creations cannot conflict
+    """
+    if created and _is_deferred():
+        _deferred.items.add(instance.pk)
+    elif created:
+        create_translations_for_items([instance.pk])
 
 
 @receiver(post_save, sender=Language)
 def create_translations_from_language(sender, instance, created, **kwargs):
-    """Creates Translation for our new Language and all existing Item instances"""
+    """
+    Creates Translation for our new Language and all existing Item instances (unless we are in sparse mode)
+    Items are handled in chunks, and translations that already exist are ignored
+    If the Language is cloned from another one, its texts are copied with a single INSERT ... SELECT instead
+    With settings.DDT_ASYNC_FANOUT, a TranslationJob is created instead
+    """
+    if not created or (get_setting("SPARSE_TRANSLATIONS") and instance.cloned_from_id is None):
+        return
+    if _is_deferred():
+        _deferred.languages[instance.pk] = instance
+    elif get_setting("ASYNC_FANOUT"):
+        enqueue_job(TranslationJob.KIND_LANGUAGE, language=instance)
+    elif instance.cloned_from_id is not None:
+        clone_language(instance, _CHUNK_SIZE)
+    else:
+        for ids in _iter_ids(Item.objects.all(), _CHUNK_SIZE):
+            create_translations_for_language(instance, ids)
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+@receiver(translations_bulk_saved)
+def invalidate_lazy_translations(sender, **kwargs):
+    """Makes the lazy translations of the process fetch their texts again, after a Translation is written"""
+    invalidate_loaders()
+
+
+@receiver(post_delete, sender=Translation)
+def delete_translation_snapshot(sender, instance, **kwargs):
+    """Empties the deleted text in the snapshot of its object, if its model inherits from SnapshotTranslatedModel"""
+    _update_translation_snapshots([instance], deleted=True)
+
+
+@receiver(post_save, sender=Translation)
+def update_translation_snapshot(sender, instance, **kwargs):
+    """Copies the saved text into the snapshot of its object, if its model inherits from SnapshotTranslatedModel"""
+    _update_translation_snapshots([instance])
+
+
+@receiver(translations_bulk_saved)
+def update_translation_snapshots(sender, translations, **kwargs):
+    """Same as 'update_translation_snapshot', for translations saved in bulk"""
+    _update_translation_snapshots(translations)
+
+
+@lru_cache(maxsize=None)
+def _get_snapshot_models():
+    """Returns the models that inherit from SnapshotTranslatedModel (computed once, since they cannot change)"""
+    return tuple(model for model in apps.get_models() if issubclass(model, SnapshotTranslatedModel))
+
+
+def _update_translation_snapshots(translations, deleted=False):
+    """
+    Copies the texts of some translations into the snapshots of their objects (or empties them, if deleted)
+    Does not query anything when no model uses a snapshot, and only 2 queries to prepare otherwise
+    """
+    if not _get_snapshot_models():
+        return
+    item_ids = {translation.item_id for translation in translations}
+    items = Item.objects.select_related("field", "content_type").in_bulk(item_ids)
+    language_names = dict(Language.objects.values_list("id", "django_language_name"))
+    for translation in translations:
+        # The Item may already be deleted, when it is the one being deleted
+        item = items.get(translation.item_id)
+        if item is None:
+            continue
+        model = item.content_type.model_class()
+        if model in _get_snapshot_models():
+            language_name = language_names[translation.language_id]
+            text = "" if deleted else translation.text
+            model.update_translation_snapshot(item.object_id, language_name, item.field.name, text)
+
+
+@receiver(post_delete, sender=Translation)
+def delete_translation_lookup(sender, instance, **kwargs):
+    """Deletes the lookup row of the deleted translation (with settings.DDT_LOOKUP_TABLE)"""
+    if get_setting("LOOKUP_TABLE"):
+        delete_translation_lookups([instance.item_id], [instance.language_id])
+
+
+@receiver(post_save, sender=Translation)
+def update_translation_lookup(sender, instance, **kwargs):
+    """Copies the saved translation into the TranslationLookup table (with settings.DDT_LOOKUP_TABLE)"""
+    if get_setting("LOOKUP_TABLE"):
+        refresh_translation_lookups([instance.item_id], [instance.language_id])
+
+
+@receiver(translations_bulk_saved)
+def update_translation_lookups(sender, translations, **kwargs):
+    """Same as 'update_translation_lookup', for translations saved in bulk"""
+    if get_setting("LOOKUP_TABLE"):
+        item_ids = {translation.item_id for translation in translations}
+        language_ids = {translation.language_id for translation in translations}
+        refresh_translation_lookups(item_ids, language_ids)
+
+
+@receiver(post_save, sender=Translation)
+def update_translation_bundle(sender, instance, **kwargs):
+    """Creates the job that rebuilds the JSON bundle of the saved translation (with settings.DDT_BUNDLE_ON_WRITE)"""
+    if get_setting("BUNDLE_ON_WRITE"):
+        app_label = Item.objects.filter(pk=instance.item_id).values_list("content_type__app_label", flat=True).get()
+        schedule_bundles([app_label], [instance.language_id])
+
+
+@receiver(translations_bulk_saved)
+def update_translation_bundles(sender, translations, **kwargs):
+    """Same as 'update_translation_bundle', for translations saved in bulk"""
+    if get_setting("BUNDLE_ON_WRITE"):
+        item_ids = {translation.item_id for translation in translations}
+        app_labels = Item.objects.filter(pk__in=item_ids).values_list("content_type__app_label", flat=True)
+        schedule_bundles(set(app_labels), {translation.language_id for translation in translations})
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def update_item_versions(sender, instance, created=True, **kwargs):
+    """Increments the versions of the content type of the created or deleted Item, in every language (on commit)"""
     if created:
-        items = Item.objects.all()
-        if len(items) > 0:
-            translations = [Translation(language=instance, item=item) for item in items]
-            Translation.objects.bulk_create(translations)
+        bump_versions_on_commit(content_type_ids=[instance.content_type_id])
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def update_translation_versions(sender, instance, **kwargs):
+    """
+    Increments the versions of the language and content type of the saved or deleted translation (on commit)
+    The bumps of a transaction are merged, so deleting an Item and its translations increments each row once
+    """
+    bump_versions_on_commit(translations=[instance])
+
+
+@receiver(translations_bulk_saved)
+def update_translations_versions(sender, translations, **kwargs):
+    """Same as 'update_translation_versions', for translations saved in bulk"""
+    bump_versions_on_commit(translations=translations)
 
 
 # --------------------------------------------------------------------------------
@@ -88,17 +372,19 @@ def create_translations_from_language(sender, instance, created, **kwargs):
 def create_translated_items(sender, instance, created, **kwargs):
     """
     Creates Item instances everytime an object is created in a translated table. Note that:
-    - "bulk_create" cannot be used on Item, so we use a loop
-    - we use "setattr" because we have the field name, not the Field instance
+    - Items are inserted with "create_items", which ignores the ones that already exist
+    - their keys are written back with an UPDATE, so "save" (and its signals) is not called again
+    - we use "setattr" to keep our instance in sync with the database
+    Within "deferred_translation_signals", the object is only recorded
     """
-    if created:
+    if created and _is_deferred():
+        _deferred.objects.setdefault(sender, set()).add(instance.pk)
+    elif created:
         fields = instance.get_translated_fields()
         if len(fields) > 0:
             for field in fields:
-                content_type = instance.get_content_type_instance()
-                item = Item.objects.create(field=field, object_id=instance.pk, content_type=content_type)
-                setattr(instance, field.name, item)
-                instance.save()
+                item_ids = create_items(field, [instance.pk])
+                setattr(instance, instance._meta.get_field(field.name).attname, item_ids[0])
         else:
             raise RuntimeError("{} has no entry in the Field table".format(sender))
 
@@ -107,7 +393,15 @@ def delete_translated_items(sender, instance, **kwargs):
     """
     Deletes Item instances everytime an object is deleted in a translated table
     Then "Translations" are automatically deleted due to its CASCADE relationship with "Item"
+    Within "deferred_translation_signals", the ids of the Items are only recorded (without any query)
     """
+    if _is_deferred():
+        for field in instance._meta.concrete_fields:
+            if field.is_relation and field.related_model is Item:
+                item_id = getattr(instance, field.attname)
+                if item_id is not None:
+                    _deferred.deleted_items.add(item_id)
+        return
     fields = instance.get_translated_fields()
     if len(fields) > 0:
         # We get the FK towards the Item model and filter the missing key to avoid errors
@@ -0,0 +1,163 @@
+# coding: utf-8
+"""
+Description:
+    Contains the logic used to copy translations from one environment to another, by only moving what changed
+    Translations are grouped in chunks, identified by "app_label.model|field|language|bucket",
+    where the bucket is a range of object ids (object_id // bucket_size)
+    Since Item ids differ between databases, rows are identified by their model, field, language, and object id
+    The sync is done in 3 steps, exchanging files so that both databases never need to be reachable at once:
+        - The target builds a manifest, with the checksum of each of its chunks
+        - The source compares it with its own checksums, and exports the rows of the chunks that differ
+        - The target applies those rows, which makes its chunks identical to the source's
+    Empty texts are ignored by the checksums, so sparse and non-sparse databases can be compared
+Functions:
+    apply_changes: Writes the exported chunks into our database, and returns the amount of written rows
+    build_manifest: Returns the checksum of each chunk of translations of our database
+    export_changes: Returns the rows of our chunks that differ from the given manifest
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+import hashlib
+
+# Django
+from django.db import transaction
+
+# Third-party
+
+# Local
+from .bulk import set_translation_texts
+from .conf import get_setting
+from .models import Field, Item, Language, Translation
+from .signals import translations_bulk_saved
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+def apply_changes(changes):
+    """
+    Description:
+        Writes the exported chunks into our database, in a single transaction
+        Each chunk replaces the texts of its range: objects missing from the chunk get an empty text
+        Rows whose object (or Field, or Language) does not exist in our database are skipped
+    Args:
+        changes (dict): The result of 'export_changes', computed by the source environment
+    Returns:
+        dict: The amount of "written" and "skipped" rows
+    """
+    bucket_size = changes["bucket_size"]
+    fields = {_get_field_label(field): field for field in Field.objects.select_related("content_type")}
+    languages = {language.django_language_name: language for language in Language.objects.all()}
+    sparse = get_setting("SPARSE_TRANSLATIONS")
+    counts = {"written": 0, "skipped": 0}
+    with transaction.atomic():
+        for chunk in changes["chunks"]:
+            field = fields.get(chunk["field"])
+            language = languages.get(chunk["language"])
+            if field is None or language is None:
+                counts["skipped"] += len(chunk["rows"])
+                continue
+            start = chunk["bucket"] * bucket_size
+            items = Item.objects.filter(field=field, object_id__gte=start, object_id__lt=start + bucket_size)
+            item_ids = dict(items.values_list("object_id", "pk"))
+            # Start from empty texts, so that the texts removed from the source are removed here too
+            existing = Translation.objects.filter(item__in=items, language=language).non_empty()
+            texts = dict.fromkeys(existing.values_list("item_id", flat=True), "")
+            for object_id, text in chunk["rows"]:
+                if object_id in item_ids:
+                    texts[item_ids[object_id]] = text
+                else:
+                    counts["skipped"] += 1
+            if sparse:
+                emptied = [item_id for item_id, text in texts.items() if not text]
+                Translation.objects.filter(item_id__in=emptied, language=language).delete()
+                texts = {item_id: text for item_id, text in texts.items() if text}
+            if texts:
+                translations = set_translation_texts(language, texts)
+                translations_bulk_saved.send(sender=Translation, translations=translations)
+                counts["written"] += len(translations)
+    return counts
+
+
+def build_manifest(bucket_size=1000):
+    """
+    Description:
+        Returns the checksum of each chunk of translations of our database, computed with a single streamed query
+    Args:
+        bucket_size (int, optional): Amount of object ids per chunk. Defaults to 1000.
+    Returns:
+        dict: The "bucket_size" and the "checksums" (sha256), indexed by chunk key
+    """
+    checksums = {key: digest.hexdigest() for key, digest in _iter_chunk_digests(bucket_size)}
+    return {"bucket_size": bucket_size, "checksums": checksums}
+
+
+def export_changes(manifest):
+    """
+    Description:
+        Compares our checksums with the manifest of the target, and returns the rows of the chunks that differ
+        Chunks that only exist in the target are exported without rows, so that the target empties them
+    Args:
+        manifest (dict): The result of 'build_manifest', computed by the target environment
+    Returns:
+        dict: The "bucket_size" and the "chunks" to apply, each one with its "rows" as [object_id, text] lists
+    """
+    bucket_size = manifest["bucket_size"]
+    theirs = manifest["checksums"]
+    ours = build_manifest(bucket_size)["checksums"]
+    keys = sorted(key for key in set(ours) | set(theirs) if ours.get(key) != theirs.get(key))
+    fields = {_get_field_label(field): field for field in Field.objects.select_related("content_type")}
+    chunks = []
+    for key in keys:
+        field_label, language_name, bucket = _parse_chunk_key(key)
+        chunk = {"field": field_label, "language": language_name, "bucket": bucket, "rows": []}
+        if key in ours:
+            start = bucket * bucket_size
+            rows = Translation.objects.filter(
+                item__field=fields[field_label],
+                item__object_id__gte=start,
+                item__object_id__lt=start + bucket_size,
+                language__django_language_name=language_name,
+            )
+            rows = rows.non_empty().with_text().order_by("item__object_id")
+            rows = rows.values_list("item__object_id", "full_text")
+            chunk["rows"] = [list(row) for row in rows]
+        chunks.append(chunk)
+    return {"bucket_size": bucket_size, "chunks": chunks}
+
+
+def _get_field_label(field):
+    """Returns the 'app_label.model|field' label of a Field, which is the same in every environment"""
+    return "{}.{}|{}".format(field.content_type.app_label, field.content_type.model, field.name)
+
+
+def _iter_chunk_digests(bucket_size):
+    """Yields the key and the sha256 digest of each chunk, streaming all the non-empty translations in order"""
+    fields = {field.pk: _get_field_label(field) for field in Field.objects.select_related("content_type")}
+    languages = dict(Language.objects.values_list("pk", "django_language_name"))
+    rows = (
+        Translation.objects.non_empty()
+        .with_text()
+        .order_by("item__field_id", "language_id", "item__object_id")
+        .values_list("item__field_id", "language_id", "item__object_id", "full_text")
+    )
+    key, digest = None, None
+    for field_id, language_id, object_id, text in rows.iterator():
+        row_key = "{}|{}|{}".format(fields[field_id], languages[language_id], object_id // bucket_size)
+        if row_key != key:
+            if key is not None:
+                yield key, digest
+            key, digest = row_key, hashlib.sha256()
+        digest.update("{}\x1f{}\x1e".format(object_id, text).encode("utf-8"))
+    if key is not None:
+        yield key, digest
+
+
+def _parse_chunk_key(key):
+    """Returns the field label, the language name, and the bucket of a chunk key"""
+    model_label, field_name, language_name, bucket = key.split("|")
+    return "{}|{}".format(model_label, field_name), language_name, int(bucket)
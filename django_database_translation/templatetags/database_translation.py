@@ -0,0 +1,60 @@
+# coding: utf-8
+"""
+Description:
+    Template tags and filters to display translations in templates, using lazy batched lookups
+    Load them in your template with {% load database_translation %}
+Filters:
+    translate: Returns the LazyTranslation of a field for the given instance
+Tags:
+    prefetch_translations: Registers the translations of several instances, to resolve them all at once
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django import template
+
+# Third-party
+
+# Local
+from ..lazy import TranslatedValues
+
+
+# --------------------------------------------------------------------------------
+# > Setup
+# --------------------------------------------------------------------------------
+register = template.Library()
+
+
+# --------------------------------------------------------------------------------
+# > Filters
+# --------------------------------------------------------------------------------
+@register.filter
+def translate(instance, field_name):
+    """
+    Returns the LazyTranslation of a field for the given instance, in the active language
+    Usage: {{ product|translate:"name" }}
+    """
+    return TranslatedValues(instance)[field_name]
+
+
+# --------------------------------------------------------------------------------
+# > Tags
+# --------------------------------------------------------------------------------
+@register.simple_tag
+def prefetch_translations(instances, *field_names):
+    """
+    Registers the translations of several instances, without running any query
+    The first translation displayed afterwards will resolve all of them in a single query
+    Instances fetched by a TranslatedQuerySet are already batched: this is only needed for other lists
+    Usage: {% prefetch_translations products "name" "description" %}
+    """
+    for instance in instances:
+        values = TranslatedValues(instance)
+        for field_name in field_names:
+            values[field_name]
+    return ""
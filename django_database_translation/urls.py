@@ -0,0 +1,32 @@
+# coding: utf-8
+"""
+Description:
+    Contains the URLs of our views, to include in your URLconf:
+        path("translations/", include("django_database_translation.urls"))
+URLs:
+    batch_translations: JSON endpoint returning the texts of many items and fields in a language
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.urls import path
+
+# Third-party
+
+# Local
+from .views import batch_translations
+
+
+# --------------------------------------------------------------------------------
+# > URLs
+# --------------------------------------------------------------------------------
+app_name = "django_database_translation"
+
+urlpatterns = [
+    path("batch/", batch_translations, name="batch_translations"),
+]
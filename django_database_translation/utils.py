@@ -2,12 +2,21 @@
 """
 Description:
     Contains helper functions to assist you when working with database translations
+Classes:
+    TranslatedJSONEncoder: JSON encoder for the dicts generated by 'instance_as_translated_dict'
 Functions:
     all_instances_as_translated_dict: Applies 'instance_as_translated_dict' to the iterable of instances
     get_current_language: Returns the current active language. Will set a default language if none is found.
+    get_request_language: Resolves the Language of a request from its URL, session, or Accept-Language header
+    get_translated_field: Returns the Field instance of an 'app_label.Model' label and a field name
     get_translation: Returns a translated text using an Item id and a Language instance
+    get_translations: Returns the translated texts of several Item ids, using a single query
     instance_as_translated_dict: Returns a model instance into a dict containing all of its fields
+    iter_instances_as_translated_dict: Generator version of 'all_instances_as_translated_dict', for large querysets
+    prefetch_translations: Attaches the translations of several instances, using a single query
     set_default_language: Sets the default language if none is chosen
+    translated_rows: Fast path that returns translated namedtuples built from "values_list", without any instance
+    translated_streaming_response: Streams the translated dicts of a queryset as JSON Lines or as a JSON array
     update_user_language: Updates the user current language following Django guildelines
 """
 
@@ -16,16 +25,44 @@ Functions:
 # > Imports
 # --------------------------------------------------------------------------------
 # Built-in
+from collections import namedtuple
+from functools import lru_cache
 
 # Django
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models.fields.files import ImageFieldFile, FieldFile
+from django.db.models.manager import BaseManager
+from django.http import StreamingHttpResponse
 from django.utils.translation import activate, LANGUAGE_SESSION_KEY
 
 # Third-party
 
 # Local
-from .models import Item, Language, Translation
+from .conf import get_setting
+from .lookups import get_non_empty_texts
+from .models import Field, Item, Language, Translation
+
+
+# --------------------------------------------------------------------------------
+# > Classes
+# --------------------------------------------------------------------------------
+class TranslatedJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder for the dicts generated by 'instance_as_translated_dict'
+    Instances that were not transformed (because of the depth) are replaced by their primary key
+    Reverse relations (managers) are replaced by None
+    """
+
+    def default(self, o):
+        """Handles model instances and managers, then falls back on the DjangoJSONEncoder"""
+        if isinstance(o, models.Model):
+            return o.pk
+        if isinstance(o, BaseManager):
+            return None
+        return super().default(o)
 
 
 # --------------------------------------------------------------------------------
@@ -36,10 +73,11 @@ def all_instances_as_translated_dict(instances, depth=True, language=None, reque
     Description:
         Applies 'instance_as_translated_dict' to the iterable of instances
         Returns a list of dicts which contains the fields of all your instances
+        The translations of the instances are fetched with a single query, and related instances are shared
         Check the 'instance_as_translated_dict' for more info
     Args:
         instances (iterable): An iterable of your model instances
-        depth (bool, optional): Determines if FK will also be transformed into dicts. Defaults to True.
+        depth (bool or int, optional): Determines if (and how deep) FK will be transformed into dicts. Defaults to True.
         language (Language, optional): A Language instance from this app. Defaults to None.
         request (HttpRequest, option): HttpRequest from Django. Defaults to None.
     Returns:
@@ -51,18 +89,15 @@ def all_instances_as_translated_dict(instances, depth=True, language=None, reque
     # Get the language from the session
     if language is None:
         language = get_current_language(request)
-    # Loop over instances
-    results = []
-    for instance in instances:
-        result = instance_as_translated_dict(instance, depth=depth, language=language)
-        results.append(result)
-    return results
+    # Loop over instances, sharing the identity map so that each (model, pk) is only transformed once
+    return list(_translate_instances(instances, _get_max_depth(depth), language))
 
 
 def get_current_language(request, set_default=True, default_id=1):
     """
     Description:
         Returns the current active language. Will set a default language if none is found.
+        If the LanguageMiddleware is installed, the language it attached to the request is returned as is
     Args:
         request (HttpRequest): HttpRequest from Django
         set_default (Boolean): Indicates if a default language must be activated (if none currently is). Default to True.
@@ -70,8 +105,11 @@ def get_current_language(request, set_default=True, default_id=1):
     Returns:
         Language: The currently used language from our app's Language model
     """
+    # Use the language resolved by our middleware (without any additional query)
+    language = getattr(request, "language", None)
+    if language is not None:
+        return language
     # Base variables
-    language = None
     language_name = request.session.get(LANGUAGE_SESSION_KEY, False)
     # Get the language
     if language_name:
@@ -86,38 +124,126 @@ def get_current_language(request, set_default=True, default_id=1):
     return language
 
 
-def get_translation(language, item_id):
+def get_request_language(request):
+    """
+    Description:
+        Resolves the Language of a request, using a single query to get all the languages
+        The sources are checked in this order:
+            - The URL prefix (ie "/fr-fr/...")
+            - The session, as set by "update_user_language"
+            - The Accept-Language header (the exact language, then its generic version, like "fr" for "fr-ca")
+            - The default language (settings.DDT_DEFAULT_LANGUAGE_ID)
+    Args:
+        request (HttpRequest): HttpRequest from Django
+    Returns:
+        Language: The Language instance to use for this request
+    """
+    languages = {language.django_language_name.lower(): language for language in Language.objects.all()}
+    # URL prefix
+    prefix = request.path_info.lstrip("/").split("/", 1)[0].lower()
+    if prefix in languages:
+        return languages[prefix]
+    # Session
+    session = getattr(request, "session", None)
+    if session is not None:
+        language_name = session.get(LANGUAGE_SESSION_KEY, "")
+        if language_name.lower() in languages:
+            return languages[language_name.lower()]
+    # Accept-Language header
+    header = request.META.get("HTTP_ACCEPT_LANGUAGE", "")
+    for language_name in _parse_accept_language(header):
+        if language_name in languages:
+            return languages[language_name]
+        generic_name = language_name.split("-")[0]
+        for name, language in languages.items():
+            if name.split("-")[0] == generic_name:
+                return language
+    # Default language
+    for language in languages.values():
+        if language.id == get_setting("DEFAULT_LANGUAGE_ID"):
+            return language
+    raise Language.DoesNotExist("No Language matches the request, and the default language does not exist")
+
+
+def get_translated_field(model_label, field_name):
+    """
+    Description:
+        Returns the Field instance of an 'app_label.Model' label and a field name (ie for management commands)
+        Raises Field.DoesNotExist if the label is invalid, or if no Field matches
+    Args:
+        model_label (str): Label of the model, as 'app_label.Model'
+        field_name (str): Name of the translated field
+    Returns:
+        Field: The Field instance from this app
+    """
+    try:
+        app_label, model_name = model_label.split(".")
+        content_type = ContentType.objects.get_by_natural_key(app_label, model_name.lower())
+        return Field.objects.get(content_type=content_type, name=field_name)
+    except (ValueError, ContentType.DoesNotExist, Field.DoesNotExist):
+        raise Field.DoesNotExist("No Field '{}' found for the model '{}'".format(field_name, model_label))
+
+
+def get_translation(language, item_id, fallback=True):
     """
     Description:
         Returns a translated text using an Item id and a Language instance
+        If the text is missing, the fallback chain of the language is used
     Args:
         language (Language): Language instance from this app
         item_id (int): Key contained in the 'translated field'
+        fallback (bool, optional): Whether to use the fallback chain of the language. Defaults to True.
     Returns:
         str: The translated text
     """
-    translation = ""
-    try:
-        entry = Translation.objects.get(language=language, item_id=item_id)
-        translation = entry.text
-    except Translation.DoesNotExist:
-        pass
-    return translation
+    return get_translations(language, [item_id], fallback=fallback).get(item_id, "")
 
 
-def instance_as_translated_dict(instance, depth=True, language=None, request=None):
+def get_translations(language, item_ids, fallback=True):
+    """
+    Description:
+        Returns the translated texts of several Item ids, using a single query
+        With "fallback", each item gets the first non-empty text from the language's fallback chain
+        Items without any text are still returned, with an empty string
+        With settings.DDT_LOOKUP_TABLE, the texts are read from the TranslationLookup table
+    Args:
+        language (Language): Language instance from this app
+        item_ids (iterable): Keys contained in the 'translated fields'
+        fallback (bool, optional): Whether to use the fallback chain of the language. Defaults to True.
+    Returns:
+        dict: The translated texts, using the item ids as keys
+    """
+    item_ids = {item_id for item_id in item_ids if item_id is not None}
+    if not item_ids:
+        return {}
+    chain = language.get_fallback_chain() if fallback else [language.id]
+    priorities = {language_id: i for i, language_id in enumerate(chain)}
+    # Keep the text with the best priority for each item
+    best = {}
+    for item_id, language_id, text in get_non_empty_texts(item_ids, chain):
+        priority = priorities[language_id]
+        if item_id not in best or priority < best[item_id][0]:
+            best[item_id] = (priority, text)
+    return {item_id: best[item_id][1] if item_id in best else "" for item_id in item_ids}
+
+
+def instance_as_translated_dict(instance, depth=True, language=None, request=None, identity_map=None):
     """
     Description:
         Returns a model instance into a dict containing all of its fields
         Language can be given as an argument, or guess through the user of "request"
-        With "depth" set to True, ForeignKey will also be transformed into sub-dict
+        With "depth", ForeignKey will also be transformed into sub-dict:
+            - True means no limit, False means no sub-dict, and an integer sets the maximum amount of levels
+            - Each (model, pk) is only transformed once, and the same dict is reused afterwards
+            - If an instance refers back to one of its parents (cycle), its primary key is used instead
         Files and images are replaced by a subdict with 'path', 'url', and 'name' keys
         Meaning you will be able to manipulate the dict in an HTML template much like an instance
     Args:
         instance (Model): An instance from any of your models
-        depth (bool, optional): Determines if FK will also be transformed into dicts. Defaults to True.
+        depth (bool or int, optional): Determines if (and how deep) FK will be transformed into dicts. Defaults to True.
         language (Language, optional): A Language instance from this app. Defaults to None.
         request (HttpRequest, option): HttpRequest from Django. Defaults to None.
+        identity_map (dict, optional): Dicts already generated, to share between several calls. Defaults to None.
     Returns:
         dict: A dict with all of the instance's fields and values
     """
@@ -127,37 +253,71 @@ def instance_as_translated_dict(instance, depth=True, language=None, request=Non
     # Get the language from the session
     if language is None:
         language = get_current_language(request)
-    # Loop over fields
-    translated_dict = {}
-    fields = instance._meta.get_fields()
-    for field in fields:
-        value = getattr(instance, field.name, None)
-        if value is not None:
-            value_type = type(value)
-            # Case 1: Get the translation
-            if value_type == Item:
-                new_value = Translation.objects.get(item=value, language=language).text
-            # Case 2: Go to the linked model and repeat the process (unless depth=False)
-            elif issubclass(value_type, models.Model):
-                if depth:
-                    new_value = instance_as_translated_dict(value, depth=True, language=language)
-                else:
-                    new_value = value
-            # Case 3:
-            elif value_type in {ImageFieldFile, FieldFile}:
-                if value:
-                    new_value = {
-                        "name": getattr(value, "name", ""),
-                        "url": getattr(value, "url", ""),
-                        "path": getattr(value, "path", ""),
-                    }
-                else:
-                    new_value = ""
-            # Case 4: Keep the value as it is
-            else:
-                new_value = value
-            translated_dict[field.name] = new_value
-    return translated_dict
+    if identity_map is None:
+        identity_map = {}
+    return _translate_instance(instance, _get_max_depth(depth), language, identity_map, {}, {})
+
+
+def iter_instances_as_translated_dict(queryset, depth=True, language=None, request=None, chunk_size=1000):
+    """
+    Description:
+        Generator version of 'all_instances_as_translated_dict', to keep the memory bounded on large querysets
+        The queryset is read with "iterator(chunk_size)", and each chunk is translated with a single query
+        The identity map is reset after each chunk, so that it does not grow with the queryset
+    Args:
+        queryset (QuerySet): A QuerySet of your model instances
+        depth (bool or int, optional): Determines if (and how deep) FK will be transformed into dicts. Defaults to True.
+        language (Language, optional): A Language instance from this app. Defaults to None.
+        request (HttpRequest, option): HttpRequest from Django. Defaults to None.
+        chunk_size (int, optional): Amount of instances fetched and translated at once. Defaults to 1000.
+    Yields:
+        dict: A dict with all of the instance's fields and values
+    """
+    # Checking arguments
+    if language is None and request is None:
+        raise TypeError("You must provide either 'language' or 'request'")
+    # Get the language from the session
+    if language is None:
+        language = get_current_language(request)
+    max_depth = _get_max_depth(depth)
+    chunk = []
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(instance)
+        if len(chunk) == chunk_size:
+            yield from _translate_instances(chunk, max_depth, language)
+            chunk = []
+    if chunk:
+        yield from _translate_instances(chunk, max_depth, language)
+
+
+def prefetch_translations(instances, field_names=None, languages=None):
+    """
+    Description:
+        Attaches the translations of several instances (of the same model) using a single query
+        Each instance gets a "prefetched_translations" attribute, containing a list of Translation instances
+        Works much like django's "prefetch_related_objects"
+    Args:
+        instances (list): Instances of a TranslatedModel
+        field_names (list, optional): Only fetch the translations of those fields. Defaults to None.
+        languages (list, optional): Only fetch the translations in those languages. Defaults to None.
+    """
+    if not instances:
+        return
+    model = type(instances[0])
+    content_type = ContentType.objects.get_for_model(model, for_concrete_model=False)
+    translations = Translation.objects.filter(
+        item__field__content_type=content_type,
+        item__object_id__in=[instance.pk for instance in instances],
+    ).select_texts()
+    if field_names is not None:
+        translations = translations.filter(item__field__name__in=field_names)
+    if languages is not None:
+        translations = translations.filter(language__in=languages)
+    grouped = {instance.pk: [] for instance in instances}
+    for translation in translations.select_related("item__field", "language"):
+        grouped[translation.item.object_id].append(translation)
+    for instance in instances:
+        instance.prefetched_translations = grouped[instance.pk]
 
 
 def set_default_language(request, pk=1):
@@ -167,6 +327,66 @@ def set_default_language(request, pk=1):
     return language
 
 
+def translated_streaming_response(queryset, depth=True, language=None, request=None, chunk_size=1000, lines=True):
+    """
+    Description:
+        Streams the translated dicts of a queryset as JSON, using 'iter_instances_as_translated_dict'
+        The memory stays bounded, and the first bytes are sent as soon as the first chunk is translated
+        The foreign keys serialized as sub-dicts are added to "select_related", to avoid one query per instance
+    Args:
+        queryset (QuerySet): A QuerySet of your model instances
+        depth (bool or int, optional): Determines if (and how deep) FK will be transformed into dicts. Defaults to True.
+        language (Language, optional): A Language instance from this app. Defaults to None.
+        request (HttpRequest, option): HttpRequest from Django. Defaults to None.
+        chunk_size (int, optional): Amount of instances fetched and translated at once. Defaults to 1000.
+        lines (bool, optional): Streams JSON Lines (one dict per line) instead of a JSON array. Defaults to True.
+    Returns:
+        StreamingHttpResponse: The response to return from your view
+    """
+    lookups = _get_related_lookups(queryset.model, _get_max_depth(depth))
+    if lookups:
+        queryset = queryset.select_related(*lookups)
+    dicts = iter_instances_as_translated_dict(queryset, depth, language, request, chunk_size)
+    encoder = TranslatedJSONEncoder()
+    if lines:
+        content = ("{}\n".format(encoder.encode(translated_dict)) for translated_dict in dicts)
+        return StreamingHttpResponse(content, content_type="application/x-ndjson")
+    return StreamingHttpResponse(_stream_json_array(dicts, encoder), content_type="application/json")
+
+
+def translated_rows(queryset, field_names, language, fallback=True, chunk_size=2000):
+    """
+    Description:
+        Fast path for read-only listings: returns translated rows without creating any model instance
+        Rows are read with "values_list", and the texts of each chunk are fetched with a single query
+        Each row is a namedtuple (a tuple with named attributes, usable in templates like an instance)
+        Field names can follow relations (ie "brand__name"), and translated fields are replaced by their text
+    Args:
+        queryset (QuerySet): A QuerySet of your model instances
+        field_names (list): Names of the fields (or lookups) to fetch
+        language (Language): A Language instance from this app
+        fallback (bool, optional): Whether to use the fallback chain of the language. Defaults to True.
+        chunk_size (int, optional): Amount of rows translated at once. Defaults to 2000.
+    Returns:
+        list: A list of namedtuples, whose attributes are the field names
+    """
+    row_class = _get_row_class(tuple(field_names))
+    translated_positions = [
+        position for position, field_name in enumerate(field_names)
+        if _is_translated_lookup(queryset.model, field_name)
+    ]
+    rows = []
+    chunk = []
+    for values in queryset.values_list(*field_names).iterator(chunk_size=chunk_size):
+        chunk.append(values)
+        if len(chunk) == chunk_size:
+            rows.extend(_translate_rows(chunk, translated_positions, row_class, language, fallback))
+            chunk = []
+    if chunk:
+        rows.extend(_translate_rows(chunk, translated_positions, row_class, language, fallback))
+    return rows
+
+
 def update_user_language(request, language=None, language_id=None):
     """
     Description:
@@ -187,3 +407,222 @@ def update_user_language(request, language=None, language_id=None):
     # Update the user's language
     activate(language.django_language_name)
     request.session[LANGUAGE_SESSION_KEY] = language.django_language_name
+    # Keep the language attached by our middleware up to date
+    if hasattr(request, "language"):
+        request.language = language
+
+
+# --------------------------------------------------------------------------------
+# > Private Functions
+# --------------------------------------------------------------------------------
+def _get_item_ids(instances):
+    """Returns the ids of all the Item linked to the instances (without loading them)"""
+    item_ids = set()
+    for instance in instances:
+        for field in instance._meta.concrete_fields:
+            if field.many_to_one and field.related_model == Item:
+                item_ids.add(getattr(instance, field.attname))
+    return item_ids
+
+
+@lru_cache(maxsize=None)
+def _get_row_class(field_names):
+    """Returns the namedtuple class used by 'translated_rows' for those field names (created only once)"""
+    return namedtuple("TranslatedRow", field_names)
+
+
+def _get_related_lookups(model, max_depth, path=()):
+    """
+    Returns the "select_related" lookups of the foreign keys transformed into sub-dicts, within the depth limit
+    Our Item keys are skipped (their texts are fetched separately), and a model is not followed twice in a path
+    """
+    if max_depth == 0:
+        return []
+    next_depth = None if max_depth is None else max_depth - 1
+    lookups = []
+    for field in model._meta.concrete_fields:
+        if not field.is_relation or field.related_model is Item or field.related_model in path:
+            continue
+        lookups.append(field.name)
+        for lookup in _get_related_lookups(field.related_model, next_depth, path + (model,)):
+            lookups.append("{}__{}".format(field.name, lookup))
+    return lookups
+
+
+def _get_max_depth(depth):
+    """Converts the "depth" argument into a maximum amount of levels (None means no limit)"""
+    if depth is True:
+        return None
+    if depth is False:
+        return 0
+    if depth < 0:
+        raise ValueError("'depth' must be a boolean or a positive integer")
+    return depth
+
+
+def _is_reusable(identity_map, key, max_depth):
+    """Checks if the identity map contains a dict for this key, generated with at least the required depth"""
+    if key not in identity_map:
+        return False
+    stored_depth = identity_map[key][0]
+    return stored_depth is None or (max_depth is not None and stored_depth >= max_depth - 1)
+
+
+def _is_translated_lookup(model, lookup):
+    """
+    Checks if a lookup (ie "brand__name") ends on a ForeignKey to our Item model
+    "pk" is resolved to the primary key, and annotations or transforms (left to "values_list") are not translated
+    """
+    field = None
+    for part in lookup.split("__"):
+        if model is None:
+            return False
+        try:
+            field = model._meta.pk if part == "pk" else model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return False
+        model = field.related_model
+    return bool(field.many_to_one) and field.related_model == Item
+
+
+def _mark_cycle(stack, key):
+    """Marks the instances transformed after "key" as incomplete, since their dicts contain a cycle placeholder"""
+    keys = list(stack)
+    for later_key in keys[keys.index(key) + 1:]:
+        stack[later_key] = False
+
+
+def _parse_accept_language(header):
+    """Returns the lowercased languages of an Accept-Language header, by decreasing quality (ie "fr-CA,fr;q=0.8")"""
+    names = []
+    for position, value in enumerate(header.split(",")):
+        name, _, parameters = value.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith("q="):
+            try:
+                quality = float(parameters[2:])
+            except ValueError:
+                continue
+        if name and name != "*" and quality > 0:
+            names.append((-quality, position, name))
+    return [name for _, _, name in sorted(names)]
+
+
+def _stream_json_array(dicts, encoder):
+    """Yields the parts of a JSON array, one dict at a time"""
+    yield "["
+    for i, translated_dict in enumerate(dicts):
+        if i > 0:
+            yield ","
+        yield encoder.encode(translated_dict)
+    yield "]"
+
+
+def _translate_instance(instance, max_depth, language, identity_map, stack, texts):
+    """
+    Description:
+        Does the actual work of 'instance_as_translated_dict'
+        Each generated dict is stored in the identity map, along with the depth it was generated with
+        The stack contains the (model, pk) currently being transformed, to detect cycles
+        Dicts that contain a cycle placeholder (a primary key) below them are not stored, since they are only
+        valid under the instance that started the cycle
+    Args:
+        instance (Model): An instance from any of your models
+        max_depth (int): Maximum amount of levels for the sub-dicts (None means no limit)
+        language (Language): A Language instance from this app
+        identity_map (dict): Dicts already generated, using (model label, pk) as keys
+        stack (dict): Keys of the instances currently being transformed (in order), with whether they are complete
+        texts (dict): Translated texts already fetched, using the Item ids as keys
+    Returns:
+        dict: A dict with all of the instance's fields and values
+    """
+    key = (instance._meta.label, instance.pk)
+    stack[key] = True
+    translated_dict = {}
+    translated_items = {}
+    fields = instance._meta.get_fields()
+    for field in fields:
+        # Case 1: Store the Item id, to get all the translations at once (without loading the Item)
+        if field.many_to_one and field.related_model == Item:
+            item_id = getattr(instance, field.attname, None)
+            if item_id is not None:
+                translated_items[field.name] = item_id
+                translated_dict[field.name] = ""
+            continue
+        # Case 2: Reuse the dict of a related instance that was already transformed (without loading it)
+        is_forward_key = field.concrete and (field.many_to_one or field.one_to_one)
+        if max_depth != 0 and is_forward_key and field.target_field.primary_key:
+            related_key = (field.related_model._meta.label, getattr(instance, field.attname))
+            if related_key in stack:
+                _mark_cycle(stack, related_key)
+                translated_dict[field.name] = related_key[1]
+                continue
+            if _is_reusable(identity_map, related_key, max_depth):
+                translated_dict[field.name] = identity_map[related_key][1]
+                continue
+        value = getattr(instance, field.name, None)
+        if value is not None:
+            value_type = type(value)
+            # Case 3: Go to the linked model and repeat the process (within the depth limit)
+            if issubclass(value_type, models.Model):
+                related_key = (value._meta.label, value.pk)
+                if max_depth == 0:
+                    new_value = value
+                elif related_key in stack:
+                    _mark_cycle(stack, related_key)
+                    new_value = value.pk
+                elif _is_reusable(identity_map, related_key, max_depth):
+                    new_value = identity_map[related_key][1]
+                else:
+                    next_depth = None if max_depth is None else max_depth - 1
+                    new_value = _translate_instance(value, next_depth, language, identity_map, stack, texts)
+            # Case 4:
+            elif value_type in {ImageFieldFile, FieldFile}:
+                if value:
+                    new_value = {
+                        "name": getattr(value, "name", ""),
+                        "url": getattr(value, "url", ""),
+                        "path": getattr(value, "path", ""),
+                    }
+                else:
+                    new_value = ""
+            # Case 5: Keep the value as it is
+            else:
+                new_value = value
+            translated_dict[field.name] = new_value
+    # Get the translations of all the Item fields with a single query (unless they were already fetched)
+    missing_ids = [item_id for item_id in translated_items.values() if item_id not in texts]
+    if missing_ids:
+        texts.update(get_translations(language, missing_ids))
+    for field_name, item_id in translated_items.items():
+        translated_dict[field_name] = texts[item_id]
+    if stack.pop(key):
+        identity_map[key] = (max_depth, translated_dict)
+    return translated_dict
+
+
+def _translate_rows(chunk, translated_positions, row_class, language, fallback):
+    """Replaces the Item ids of a chunk of rows by their texts, and returns the namedtuples"""
+    item_ids = {values[position] for values in chunk for position in translated_positions}
+    texts = get_translations(language, item_ids, fallback=fallback)
+    rows = []
+    for values in chunk:
+        values = list(values)
+        for position in translated_positions:
+            values[position] = texts.get(values[position], "")
+        rows.append(row_class._make(values))
+    return rows
+
+
+def _translate_instances(instances, max_depth, language):
+    """
+    Generates the dicts of several instances, sharing the same identity map
+    The translations of all the instances are fetched beforehand, with a single query
+    """
+    instances = list(instances)
+    identity_map = {}
+    texts = get_translations(language, _get_item_ids(instances))
+    for instance in instances:
+        yield _translate_instance(instance, max_depth, language, identity_map, {}, texts)
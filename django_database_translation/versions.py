@@ -0,0 +1,225 @@
+# coding: utf-8
+"""
+Description:
+    Contains the logic used to version the translations, so that clients can use conditional requests
+    With settings.DDT_TRACK_VERSIONS, every write of a Translation or an Item increments the TranslationVersion rows
+    of its language(s): the global row (without content type), and the row of its content type
+    The "translations_condition" view decorator turns those versions into an ETag and a Last-Modified header,
+    so that unchanged responses are answered with a 304 before the view (and its queries) is run
+    Since the fallback chain of a language is part of its texts, its versions are part of the ETag too
+    The per-row signals only record their bumps, which are merged and run once the transaction commits
+    (so that a cascaded delete increments each row once, and clients never cache uncommitted texts)
+    The bulk operations of this app use the same path, and "bump_versions" is only the primitive that runs them
+    Note that writes that bypass our models and signals (ie raw SQL) are not tracked
+Functions:
+    bump_translation_versions: Increments the versions of the languages and content types of some translations
+    bump_versions: Increments the versions of some content types, in some (or all) languages
+    bump_versions_on_commit: Records some bumps, merged and run when the current transaction commits
+    get_versions: Returns the ETag and the last modification date of the translations of a language
+Decorators:
+    translations_condition: Answers conditional GET requests with a 304 when the translations did not change
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+import hashlib
+import threading
+
+# Django
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+# Third-party
+
+# Local
+from .conf import get_setting
+from .models import Item, Language, TranslationVersion
+from .utils import get_request_language
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+# Each thread records its own bumps, until its transaction commits
+_pending = threading.local()
+
+
+def bump_translation_versions(translations):
+    """Increments the versions of the languages and content types of some Translation instances"""
+    if not get_setting("TRACK_VERSIONS"):
+        return
+    _bump_item_versions({(translation.language_id, translation.item_id) for translation in translations})
+
+
+def bump_versions(content_type_ids, language_ids=None):
+    """
+    Description:
+        Increments the versions of some content types, and the global version of the languages, immediately
+        Writes should use "bump_versions_on_commit" instead, which runs this once the transaction commits
+        The missing rows are first created at version 0 (ignoring the ones created by another process in the meantime)
+        so that a single UPDATE then increments every row, without losing a concurrent bump
+        Does nothing unless settings.DDT_TRACK_VERSIONS is enabled
+    Args:
+        content_type_ids (iterable): Ids of the ContentType instances whose translations changed
+        language_ids (iterable, optional): Ids of the Language instances that changed. Defaults to None (all of them).
+    """
+    if not get_setting("TRACK_VERSIONS"):
+        return
+    content_type_ids = set(content_type_ids)
+    if language_ids is None:
+        language_ids = Language.objects.values_list("pk", flat=True)
+    language_ids = set(language_ids)
+    if not language_ids:
+        return
+    now = timezone.now()
+    versions = TranslationVersion.objects.filter(language_id__in=language_ids).filter(
+        Q(content_type_id__in=content_type_ids) | Q(content_type__isnull=True)
+    )
+    existing = set(versions.values_list("language_id", "content_type_id"))
+    missing = [
+        TranslationVersion(language_id=language_id, content_type_id=content_type_id, version=0, updated_at=now)
+        for language_id in language_ids
+        for content_type_id in content_type_ids | {None}
+        if (language_id, content_type_id) not in existing
+    ]
+    if missing:
+        TranslationVersion.objects.bulk_create(missing, ignore_conflicts=True)
+    versions.update(version=F("version") + 1, updated_at=now)
+
+
+def bump_versions_on_commit(translations=(), content_type_ids=(), language_ids=None):
+    """
+    Description:
+        Same as "bump_translation_versions" and "bump_versions", but run on commit
+        All the bumps of a transaction are merged, so that each row is incremented once (ie a cascaded delete)
+        Outside of a transaction, they are run immediately
+        If the transaction is rolled back, its bumps are run with the next commit (a spare bump is harmless)
+    Args:
+        translations (iterable, optional): Translation instances that were written. Defaults to ().
+        content_type_ids (iterable, optional): Ids of the ContentType instances whose Items changed. Defaults to ().
+        language_ids (iterable, optional): Only bump the content types in those languages. Defaults to None (all).
+    """
+    if not get_setting("TRACK_VERSIONS"):
+        return
+    if not hasattr(_pending, "keys"):
+        _pending.keys = set()
+        _pending.content_types = {}
+    _pending.keys.update((translation.language_id, translation.item_id) for translation in translations)
+    content_type_ids = set(content_type_ids)
+    if content_type_ids:
+        # The content types to bump in every language are stored with a None key
+        for language_id in [None] if language_ids is None else language_ids:
+            _pending.content_types.setdefault(language_id, set()).update(content_type_ids)
+    # Each call registers the callback, since the ones of a rolled back transaction are discarded
+    transaction.on_commit(_run_pending_bumps, using=router.db_for_write(TranslationVersion))
+
+
+def get_versions(language, models=None):
+    """
+    Description:
+        Returns the ETag and the last modification date of the translations of a language, with a single query
+        Both include the languages of its fallback chain
+    Args:
+        language (Language): Language instance from this app
+        models (list, optional): Only use the versions of those models. Defaults to None (the global versions).
+    Returns:
+        tuple: The ETag (str) and the last modification date (datetime, or None if nothing was written yet)
+    """
+    chain = language.get_fallback_chain()
+    versions = TranslationVersion.objects.filter(language_id__in=chain)
+    if models:
+        content_types = ContentType.objects.get_for_models(*models, for_concrete_models=False)
+        versions = versions.filter(content_type__in=list(content_types.values()))
+    else:
+        versions = versions.filter(content_type__isnull=True)
+    rows = {}
+    last_modified = None
+    for language_id, content_type_id, version, updated_at in versions.values_list(
+        "language_id", "content_type_id", "version", "updated_at"
+    ):
+        key = (language_id, content_type_id)
+        rows[key] = max(rows.get(key, 0), version)
+        if last_modified is None or updated_at > last_modified:
+            last_modified = updated_at
+    signature = "{}|{}".format(chain, sorted(rows.items(), key=lambda row: (row[0][0], row[0][1] or 0)))
+    return hashlib.sha256(signature.encode("utf-8")).hexdigest()[:32], last_modified
+
+
+def _bump_item_versions(keys, content_types=None):
+    """
+    Increments the versions of some (language_id, item_id) keys, with a single query to find their content types
+    The given content type ids (by language id, None meaning every language) are merged in, so that each row
+    is incremented once
+    """
+    item_ids = {item_id for _, item_id in keys}
+    content_types = content_types or {}
+    changes = {}
+    if content_types.get(None):
+        languages = Language.objects.values_list("pk", flat=True)
+        changes = {language_id: set(content_types[None]) for language_id in languages}
+    for language_id, content_type_ids in content_types.items():
+        if language_id is not None:
+            changes.setdefault(language_id, set()).update(content_type_ids)
+    content_types = dict(Item.objects.filter(pk__in=item_ids).values_list("pk", "content_type_id"))
+    for language_id, item_id in keys:
+        changes.setdefault(language_id, set())
+        if content_types.get(item_id):
+            changes[language_id].add(content_types[item_id])
+    for language_id, language_content_type_ids in changes.items():
+        bump_versions(language_content_type_ids, [language_id])
+
+
+def _run_pending_bumps():
+    """Runs the bumps recorded by "bump_versions_on_commit" in this thread (the next callbacks find nothing to do)"""
+    keys = getattr(_pending, "keys", set())
+    content_types = getattr(_pending, "content_types", {})
+    _pending.keys, _pending.content_types = set(), {}
+    if keys or content_types:
+        _bump_item_versions(keys, content_types)
+
+
+# --------------------------------------------------------------------------------
+# > Decorators
+# --------------------------------------------------------------------------------
+def translations_condition(*models):
+    """
+    Description:
+        View decorator that answers conditional GET requests with a 304 when the translations did not change
+        The ETag and Last-Modified headers are computed from the versions of the request's language (see "get_versions")
+        The language is the one of the LanguageMiddleware, or is resolved from the request
+        If no language matches the request, no header is added and the view is always run
+        Without settings.DDT_TRACK_VERSIONS, the view is always run and no header is added
+    Args:
+        *models: Only use the versions of those models (ie the ones serialized by the view). Defaults to all of them.
+    Returns:
+        function: The decorator, built with django's "condition"
+    """
+
+    def get_request_versions(request):
+        """Returns the versions of the request's language, computed once per request"""
+        if not get_setting("TRACK_VERSIONS"):
+            return None, None
+        if not hasattr(request, "translation_versions"):
+            try:
+                language = getattr(request, "language", None) or get_request_language(request)
+            except Language.DoesNotExist:
+                request.translation_versions = (None, None)
+            else:
+                request.translation_versions = get_versions(language, models)
+        return request.translation_versions
+
+    def etag(request, *args, **kwargs):
+        """Returns the ETag of the request's translations"""
+        return get_request_versions(request)[0]
+
+    def last_modified(request, *args, **kwargs):
+        """Returns the last modification date of the request's translations"""
+        return get_request_versions(request)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,128 @@
+# coding: utf-8
+"""
+Description:
+    Contains the views of our app (see "urls.py")
+Views:
+    batch_translations: JSON endpoint returning the texts of many items and fields in a language, with a single query
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+
+# Django
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+# Third-party
+
+# Local
+from .conf import get_setting
+from .models import Item, Language
+from .utils import get_request_language, get_translations
+
+
+# --------------------------------------------------------------------------------
+# > Views
+# --------------------------------------------------------------------------------
+@require_GET
+def batch_translations(request):
+    """
+    Description:
+        JSON endpoint returning the texts of many items and fields in a language, to avoid one request per object
+        The query string accepts:
+            - items: comma-separated Item ids (ie "items=12,13")
+            - fields: comma-separated "app_label.model.object_id.field" keys (ie "fields=shop.product.12.name")
+            - language: django language name (ie "fr-fr"). Defaults to the language of the request.
+            - fallback: "0" to disable the fallback chain of the language
+        The fields are resolved into Items with a single query, then all the texts are fetched with another one
+        Up to settings.DDT_BATCH_LIMIT items and fields can be requested at once
+        The endpoint is public, unless settings.DDT_BATCH_PERMISSION is set to a permission name
+        (ie "django_database_translation.view_translation") or to a callable that receives the request
+    Args:
+        request (HttpRequest): HttpRequest from Django
+    Returns:
+        JsonResponse: The "language", and the texts of the "items" and "fields" indexed by their keys
+    """
+    if not _has_permission(request):
+        return _error_response("You are not allowed to read the translations", status=403)
+    items = [value for value in request.GET.get("items", "").split(",") if value]
+    fields = [value for value in request.GET.get("fields", "").split(",") if value]
+    if len(items) + len(fields) > get_setting("BATCH_LIMIT"):
+        return _error_response("At most {} items and fields can be requested".format(get_setting("BATCH_LIMIT")))
+    # Language
+    language_name = request.GET.get("language")
+    if language_name:
+        language = Language.objects.filter(django_language_name__iexact=language_name).first()
+        if language is None:
+            return _error_response("Unknown language '{}'".format(language_name), status=404)
+    else:
+        try:
+            language = getattr(request, "language", None) or get_request_language(request)
+        except Language.DoesNotExist:
+            return _error_response("No language matches the request", status=404)
+    # Keys
+    try:
+        item_ids = {value: int(value) for value in items}
+        field_keys = {value: _parse_field_key(value) for value in fields}
+    except (ValueError, ContentType.DoesNotExist):
+        return _error_response("Items must be ids, and fields must be 'app_label.model.object_id.field' keys")
+    field_item_ids = _get_field_item_ids(field_keys.values())
+    texts = get_translations(
+        language,
+        set(item_ids.values()) | set(field_item_ids.values()),
+        fallback=request.GET.get("fallback") != "0",
+    )
+    data = {
+        "language": language.django_language_name,
+        "items": {key: texts.get(item_id, "") for key, item_id in item_ids.items()},
+        "fields": {
+            key: texts.get(field_item_ids[field_key], "")
+            for key, field_key in field_keys.items()
+            if field_key in field_item_ids
+        },
+    }
+    return JsonResponse(data, json_dumps_params={"ensure_ascii": False, "separators": (",", ":")})
+
+
+# --------------------------------------------------------------------------------
+# > Functions
+# --------------------------------------------------------------------------------
+def _error_response(message, status=400):
+    """Returns a JSON response describing an invalid request"""
+    return JsonResponse({"error": message}, status=status)
+
+
+def _get_field_item_ids(field_keys):
+    """Returns the Item ids of the given (content_type_id, object_id, field_name) keys, using a single query"""
+    object_ids = {}
+    for content_type_id, object_id, field_name in field_keys:
+        object_ids.setdefault((content_type_id, field_name), set()).add(object_id)
+    if not object_ids:
+        return {}
+    query = Q()
+    for (content_type_id, field_name), ids in object_ids.items():
+        query |= Q(content_type_id=content_type_id, field__name=field_name, object_id__in=ids)
+    rows = Item.objects.filter(query).values_list("content_type_id", "object_id", "field__name", "pk")
+    return {(content_type_id, object_id, field_name): pk for content_type_id, object_id, field_name, pk in rows}
+
+
+def _has_permission(request):
+    """Checks if the request can read the translations, according to settings.DDT_BATCH_PERMISSION"""
+    permission = get_setting("BATCH_PERMISSION")
+    if permission is None:
+        return True
+    if callable(permission):
+        return permission(request)
+    return request.user.has_perm(permission)
+
+
+def _parse_field_key(key):
+    """Returns the (content_type_id, object_id, field_name) of an 'app_label.model.object_id.field' key"""
+    app_label, model, object_id, field_name = key.split(".")
+    content_type = ContentType.objects.get_by_natural_key(app_label, model.lower())
+    return content_type.pk, int(object_id), field_name
@@ -0,0 +1,89 @@
+# coding: utf-8
+"""
+Description:
+    Example settings to try the TranslationRouter locally, with two SQLite databases instead of a real replica
+    Since nothing copies "primary.sqlite3" into "replica.sqlite3", a read only sees a write if it was routed
+    to the primary, which makes the read-your-writes guard easy to observe
+    From the root of the repository, create the tables in both databases (the router allows it on the replicas)
+    ("--run-syncdb" creates the tables of our app, whose migrations are disabled below since each project
+    generates its own):
+        - django-admin migrate --pythonpath . --settings examples.replica_settings --run-syncdb
+        - django-admin migrate --pythonpath . --settings examples.replica_settings --run-syncdb --database replica
+    Then, in "django-admin shell --pythonpath . --settings examples.replica_settings":
+        - Language.objects.create(...) writes in the primary and pins the thread, so reads see the new row
+        - After "unpin()" (done by each request and by "read_scope"), reads go to the replica, which is empty
+    With "TEST": {"MIRROR": "default"}, Django's test runner makes the replica use the test database of "default",
+    so both aliases see the same rows (as a synchronous replica would)
+    Add your own applications and urls to use it in a project
+"""
+
+
+# --------------------------------------------------------------------------------
+# > Imports
+# --------------------------------------------------------------------------------
+# Built-in
+import os
+
+# Django
+
+# Third-party
+
+# Local
+
+
+# --------------------------------------------------------------------------------
+# > Settings
+# --------------------------------------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SECRET_KEY = "example-only"
+DEBUG = True
+
+INSTALLED_APPS = [
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.messages",
+    "django.contrib.sessions",
+    "django_database_translation",
+]
+
+MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django_database_translation.middleware.TranslationRouterMiddleware",
+]
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "context_processors": [
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+            ],
+        },
+    },
+]
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(BASE_DIR, "primary.sqlite3"),
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(BASE_DIR, "replica.sqlite3"),
+        "TEST": {"MIRROR": "default"},
+    },
+}
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+MIGRATION_MODULES = {"django_database_translation": None}
+
+DATABASE_ROUTERS = ["django_database_translation.routers.TranslationRouter"]
+DDT_READ_DATABASES = ["replica"]
+DDT_WRITE_DATABASE = "default"
+DDT_PIN_SECONDS = 5
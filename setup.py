@@ -34,7 +34,15 @@ setup(
     url='https://github.com/Jordan-Kowal/django_database_translation',
     download_url='https://github.com/Jordan-Kowal/django_database_translation/archive/v1.1.4.tar.gz',
     # Packages
-    packages=['django_database_translation'],
+    packages=[
+        'django_database_translation',
+        'django_database_translation.management',
+        'django_database_translation.management.commands',
+        'django_database_translation.templatetags',
+    ],
+    package_data={
+        'django_database_translation': ['templates/admin/django_database_translation/language/*.html'],
+    },
     install_requires=[],
     # Other info
     keywords=["django", "database", "db", "translation", "translate", "backend"],